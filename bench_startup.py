@@ -0,0 +1,104 @@
+"""启动耗时基准：在全新的子进程中测量 导入 pro2 -> 创建主窗口 -> 首帧绘制 -> 后台预热完成 的耗时。
+
+用法：
+    python bench_startup.py              # 默认运行 5 次，输出各阶段中位数
+    python bench_startup.py -n 10 --json # 输出 JSON，便于记录和对比
+    python bench_startup.py --offscreen  # 无显示环境（CI）下运行
+
+每次测量都启动新的解释器，避免模块缓存影响结果；同时记录首帧时 pandas 是否已被导入，
+用于确认重量级依赖没有回到启动路径上。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_child():
+    t0 = time.perf_counter()
+    sys.path.insert(0, HERE)
+    import pro2
+    t_import = time.perf_counter()
+
+    import threading
+    from PyQt6.QtCore import QTimer
+
+    # 与 pro2 的 __main__ 相同的启动路径，包括首帧后的后台预热
+    app, window, notifier = pro2.start_gui(sys.argv[:1])
+    t_window = time.perf_counter()
+    result = {}
+
+    def wait_for_preload():
+        # 预热线程结束且 pandas 已导入，即为首次转换无需再等待导入的时间点
+        running = any(t.name == "preload" for t in threading.enumerate())
+        if not running and "pandas" in sys.modules:
+            result["preload_done"] = time.perf_counter() - t0
+            app.quit()
+            return
+        QTimer.singleShot(10, wait_for_preload)
+
+    def on_first_paint():
+        # 与 pro2 自身的槽同步执行，此时后台预热尚未开始
+        result["first_paint"] = time.perf_counter() - t0
+        result["pandas_loaded_at_paint"] = "pandas" in sys.modules
+        QTimer.singleShot(10, wait_for_preload)
+
+    notifier.first_painted.connect(on_first_paint)
+    QTimer.singleShot(30000, app.quit)  # 兜底，防止收不到绘制事件时挂起
+    app.exec()
+
+    result["import"] = t_import - t0
+    result["window"] = t_window - t0
+    print(json.dumps(result))
+
+
+def run_once(offscreen: bool):
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                         capture_output=True, text=True, env=env, check=True).stdout
+    wall = time.perf_counter() - start
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_wall"] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="宽表转换工具启动耗时基准")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="测量次数（默认 5）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--offscreen", action="store_true", help="使用 Qt offscreen 平台运行")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    runs = [run_once(args.offscreen) for _ in range(args.runs)]
+    stages = ["import", "window", "first_paint", "preload_done", "process_wall"]
+    summary = {k: statistics.median(r[k] for r in runs if k in r) for k in stages}
+    summary["pandas_loaded_at_paint"] = any(r.get("pandas_loaded_at_paint") for r in runs)
+    summary["runs"] = len(runs)
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+    print(f"测量次数：{len(runs)}（取中位数）")
+    print(f"  导入 pro2：        {summary['import'] * 1000:8.1f} ms")
+    print(f"  主窗口创建完成：   {summary['window'] * 1000:8.1f} ms")
+    print(f"  首帧绘制：         {summary['first_paint'] * 1000:8.1f} ms")
+    print(f"  后台预热完成：     {summary['preload_done'] * 1000:8.1f} ms")
+    print(f"  进程总耗时：       {summary['process_wall'] * 1000:8.1f} ms")
+    print(f"  首帧时已导入 pandas：{'是' if summary['pandas_loaded_at_paint'] else '否'}")
+
+
+if __name__ == "__main__":
+    main()
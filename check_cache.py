@@ -0,0 +1,87 @@
+"""列式缓存一致性检查：同一文件分别直接读取和从缓存读取后转换，结果必须完全相同。
+
+用法：
+    python check_cache.py            # 固定用例 + 100 个随机工作表
+    python check_cache.py -n 1000    # 更多随机工作表
+    python check_cache.py --seed 7   # 复现某次随机结果
+
+DataFrame.equals 把 None 与 NaN 视为相同，但两者写入单元格时分别成为 "None" 与 "nan"，
+因此这里逐个比较单元格的值和类型。缓存无法保存的工作表（混合类型列）只检查回退读取。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import pro2  # noqa: E402
+from check_chunked import FIXED_CASES, VALUE_COLUMNS, make_rule, random_rows, write_sheet  # noqa: E402
+
+
+def cell_values(df):
+    """(列名, 列类型, 每个单元格的 (类型名, repr)) ——  区分 None、NaN 与 NaT。"""
+    return [(col, str(df[col].dtype), [(type(v).__name__, repr(v)) for v in df[col].tolist()])
+            for col in df.columns]
+
+
+def check_file(path, cache_dir):
+    """返回不一致的描述列表；为空表示一致。"""
+    problems = []
+    cache = pro2.SheetCache(cache_dir)
+    cache.clear()
+    cold, hit = pro2.read_excel_cached(path, cache)
+    warm, hit = pro2.read_excel_cached(path, cache)
+    if not hit:
+        return problems  # 混合类型列不缓存，两次都是直接读取
+    if cell_values(warm) != cell_values(cold):
+        problems.append("读取不一致")
+    for trim, value_type in [(True, "text"), (False, "text"), (False, "date")]:
+        rule = make_rule(trim, value_type)
+        outputs = []
+        for df in (cold, warm):
+            try:
+                out = pro2.convert_dataframe(df.copy(), rule, "指标", rule["general_output_map"])
+                outputs.append(cell_values(out))
+            except Exception as e:
+                outputs.append(f"{type(e).__name__}: {e}")
+        if outputs[0] != outputs[1]:
+            problems.append(f"转换结果不一致（trim={trim}, {value_type}）")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查缓存读取与直接读取的转换结果是否一致")
+    parser.add_argument("-n", "--random", type=int, default=100, help="随机工作表数量（默认 100）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    if not pro2.SheetCache.available():
+        print("未安装 pyarrow，跳过缓存检查。")
+        return 0
+    r = random.Random(args.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_dir = os.path.join(workdir, "cache")
+        cases = [(name, [row + [""] * (len(VALUE_COLUMNS) - len(row)) for row in rows], 2)
+                 for name, rows in FIXED_CASES.items()]
+        cases += [(f"random#{i}", random_rows(r, r.randint(1, 12), len(VALUE_COLUMNS)), r.randint(0, 2))
+                  for i in range(args.random)]
+        for name, rows, trailing in cases:
+            path = os.path.join(workdir, "input.xlsx")
+            write_sheet(path, rows, VALUE_COLUMNS, trailing)
+            problems = check_file(path, cache_dir)
+            if problems:
+                failures += 1
+                print(f"[不一致] {name}：{rows}")
+                for p in problems:
+                    print(f"    {p}")
+    total = len(FIXED_CASES) + args.random
+    print(f"检查 {total} 个工作表，{failures} 个不一致。")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
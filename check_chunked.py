@@ -0,0 +1,170 @@
+"""分块策略一致性检查：同一文件分别按整表（in_memory）和分块（chunked）策略转换，结果必须完全相同。
+
+用法：
+    python check_chunked.py            # 固定用例 + 100 个随机工作表
+    python check_chunked.py -n 1000    # 更多随机工作表
+    python check_chunked.py --seed 7   # 复现某次随机结果
+
+检查两层：
+  1. 读取：iter_xlsx_chunks 各块拼接后与 read_excel 的结果（值和列类型）相同；
+  2. 输出：convert_file_job 两种策略写出的 xlsx 单元格逐一相同。
+每个文件都以多个分块大小（包括 1、2 行）运行，确保结果不受分块边界影响。
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import pro2  # noqa: E402
+
+CHUNK_SIZES = [1, 2, 3, 7, 1000]
+VALUE_COLUMNS = ["2024-01", "2024-02", "2024-03", "2024-04"]
+
+# 随机工作表中每列从以下几类单元格中取值
+CELL_KINDS = {
+    "int": lambda r: r.randint(-5, 5),
+    "float": lambda r: r.choice([0.5, 2.25, -1.75]),
+    "integral_float": lambda r: float(r.randint(0, 3)),
+    "bool": lambda r: r.choice([True, False]),
+    "text": lambda r: r.choice(["a", " b", "c  "]),
+    "numeric_text": lambda r: r.choice(["1", "2.5", "007"]),
+    "bool_text": lambda r: r.choice(["True", "false"]),
+    "na_text": lambda r: r.choice(["NA", "null", "n/a"]),
+    "error": lambda r: "#DIV/0!",
+    "date": lambda r: datetime.datetime(2024, 1, r.randint(1, 28)),
+}
+
+FIXED_CASES = {
+    # 整数与空值混合：整表读取时为浮点列，分块时某些块全为整数或全为空
+    "int_with_blanks": [[1, ""], ["", ""], [3, ""], [4, ""]],
+    "blank_chunk_in_text": [["a", "x"], ["", ""], ["", ""], ["b", 2]],
+    "bool_then_int": [[True, 1], [False, 2], [3, True], ["", ""]],
+    "dates_and_blanks": [[datetime.datetime(2024, 1, 1), 1.5], ["", ""],
+                         ["", ""], [datetime.datetime(2024, 1, 3), 2]],
+    "bool_text_then_number": [["True", 1], ["false", 2], [5, 3], [6, 4]],
+}
+
+
+def write_sheet(path, rows, value_columns, trailing_blank_rows=0):
+    from openpyxl import Workbook
+    book = Workbook()
+    sheet = book.active
+    sheet.append(["编号"] + value_columns)
+    for i, values in enumerate(rows, start=1):
+        sheet.append([f"ID{i % 5}"] + [None if v == "" else v for v in values])
+    for _ in range(trailing_blank_rows):
+        sheet.append([None] * (len(value_columns) + 1))
+    book.save(path)
+
+
+def random_rows(r, n_rows, n_cols):
+    palettes = [r.sample(sorted(CELL_KINDS), r.randint(1, 3)) for _ in range(n_cols)]
+    blank_rates = [r.choice([0, 0, 0.2, 0.6, 1]) for _ in range(n_cols)]
+    rows = []
+    for _ in range(n_rows):
+        if r.random() < 0.05:
+            rows.append([""] * n_cols)  # 中间的整行空行
+            continue
+        rows.append(["" if r.random() < blank_rates[c] else CELL_KINDS[r.choice(palettes[c])](r)
+                     for c in range(n_cols)])
+    return rows
+
+
+def make_rule(trim: bool, value_type: str):
+    return {
+        "selected_columns": VALUE_COLUMNS,
+        "index_column": "编号",
+        "index_alias": "编号",
+        "value_column_alias": "日期",
+        "expand_mode": "index_then_value",
+        "enable_serial_number": True,
+        "enable_trim_and_prefix": trim,
+        "data_prefix": "#",
+        "duplicate_agg": "none",
+        "value_column_type": value_type,
+        "value_column_format": "",
+        "general_output_map": {"序号": "序号", "索引列名": "编号", "转换后列名": "日期"},
+    }
+
+
+def read_cells(path):
+    from openpyxl import load_workbook
+    book = load_workbook(path, read_only=True)
+    try:
+        rows = []
+        for row in book.worksheets[0].iter_rows(values_only=True):
+            row = list(row)
+            while row and row[-1] is None:  # 空单元格写与不写没有区别
+                row.pop()
+            rows.append(row)
+        return rows
+    finally:
+        book.close()
+
+
+def check_file(path, workdir):
+    """返回不一致的描述列表；为空表示一致。"""
+    pd = pro2.pd
+    problems = []
+    expected = pd.read_excel(path, engine="openpyxl")
+    for chunk_rows in CHUNK_SIZES:
+        chunks = list(pro2.iter_xlsx_chunks(path, chunk_rows))
+        got = pd.concat(chunks, ignore_index=True) if chunks else expected.iloc[0:0]
+        try:
+            pd.testing.assert_frame_equal(got, expected, check_dtype=True)
+        except AssertionError as e:
+            problems.append(f"读取不一致（chunk_rows={chunk_rows}）：{e}")
+
+    for trim, value_type in [(True, "text"), (False, "text"), (False, "date")]:
+        rule = make_rule(trim, value_type)
+        reference = os.path.join(workdir, "in_memory.xlsx")
+        pro2.convert_file_job(path, reference, rule, None, None, "in_memory")
+        reference_cells = read_cells(reference)
+        for chunk_rows in CHUNK_SIZES:
+            out = os.path.join(workdir, "chunked.xlsx")
+            pro2.convert_file_job(path, out, rule, None, None, "chunked", chunk_rows)
+            cells = read_cells(out)
+            if cells != reference_cells:
+                diff = next(i for i, (a, b) in enumerate(zip(cells + [None] * len(reference_cells),
+                                                              reference_cells + [None] * len(cells)))
+                            if a != b)
+                problems.append(f"输出不一致（trim={trim}, {value_type}, chunk_rows={chunk_rows}）第 {diff + 1} 行："
+                                f"分块 {cells[diff] if diff < len(cells) else None!r} / "
+                                f"整表 {reference_cells[diff] if diff < len(reference_cells) else None!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查分块转换与整表转换的输出是否一致")
+    parser.add_argument("-n", "--random", type=int, default=100, help="随机工作表数量（默认 100）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    r = random.Random(args.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = [(name, [row + [""] * (len(VALUE_COLUMNS) - len(row)) for row in rows], 2)
+                 for name, rows in FIXED_CASES.items()]
+        cases += [(f"random#{i}", random_rows(r, r.randint(1, 12), len(VALUE_COLUMNS)), r.randint(0, 2))
+                  for i in range(args.random)]
+        for name, rows, trailing in cases:
+            path = os.path.join(workdir, "input.xlsx")
+            write_sheet(path, rows, VALUE_COLUMNS, trailing)
+            problems = check_file(path, workdir)
+            if problems:
+                failures += 1
+                print(f"[不一致] {name}：{rows}")
+                for p in problems:
+                    print(f"    {p}")
+    total = len(FIXED_CASES) + args.random
+    print(f"检查 {total} 个工作表，{failures} 个不一致。")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""共享文件夹多机处理的本地检查：在本机启动多个 worker 进程，模拟多台机器处理同一个共享文件夹。
+
+用法：
+    python check_distributed.py              # 3 个 worker，6 个文件
+    python check_distributed.py -w 4 -f 10   # 4 个 worker，10 个文件
+    python check_distributed.py --keep       # 保留临时目录，便于查看 logs/ 下各 worker 的日志
+
+检查过程：
+  1. 以规则 A 发布一批任务并启动 worker（pro2.py --worker，与实际部署相同的入口）；
+  2. 在 A 批次仍有任务处理中时，以不同的规则 B 重新发布同一批文件；
+  3. 等待 B 批次全部完成，确认：
+     - 每个结果都按规则 B 生成，数据列名为原文件名（经 value_output_map 映射），与本机直接转换的结果相同；
+     - 任务编号不与 A 批次重复，A 批次的结果记录和输出都没有混入；
+     - worker 在遇到新批次的任务时重新加载了规则。
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import pro2  # noqa: E402
+
+TIMEOUT_SECONDS = 180
+ROWS_PER_FILE = 1500
+VALUE_COLUMNS = [f"2024-{m:02d}" for m in range(1, 13)]
+
+
+def make_rule(expand_mode: str, value_alias: str) -> dict:
+    return {
+        "selected_columns": VALUE_COLUMNS,
+        "index_column": "编号",
+        "index_alias": "编号",
+        "value_column_alias": value_alias,
+        "expand_mode": expand_mode,
+        "enable_serial_number": True,
+        "enable_trim_and_prefix": True,
+        "data_prefix": "#",
+        "output_name_template": "清洗_{basename}.xlsx",
+        "general_output_map": {"序号": "序号", "索引列名": "编号", "转换后列名": value_alias},
+    }
+
+
+def write_inputs(folder: str, count: int) -> list:
+    pd = pro2.pd
+    paths = []
+    for k in range(1, count + 1):
+        df = pd.DataFrame({"编号": [f"ID{i}" for i in range(ROWS_PER_FILE)]})
+        for j, col in enumerate(VALUE_COLUMNS):
+            df[col] = [i * 100 + j + k for i in range(ROWS_PER_FILE)]
+        path = os.path.join(folder, f"指标{k}.xlsx")
+        df.to_excel(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def wait_for(predicate, what: str):
+    deadline = time.time() + TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.2)
+    raise TimeoutError(f"等待超时：{what}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本机启动多个 worker 进程检查共享文件夹任务")
+    parser.add_argument("-w", "--workers", type=int, default=3, help="worker 进程数（默认 3）")
+    parser.add_argument("-f", "--files", type=int, default=6, help="输入文件数（默认 6）")
+    parser.add_argument("--keep", action="store_true", help="结束后保留临时目录")
+    args = parser.parse_args()
+
+    pd = pro2.pd
+    root = tempfile.mkdtemp(prefix="kuanbiao_distributed_")
+    shared = os.path.join(root, "shared")
+    source = os.path.join(root, "source")
+    os.makedirs(source)
+    inputs = write_inputs(source, args.files)
+    value_output_map = {f"指标{k}": f"{k}号指标" for k in range(1, args.files + 1)}
+    rule_a = make_rule("index_then_value", "日期")
+    rule_b = make_rule("value_then_index", "月份")
+    problems = []
+    workers = []
+    try:
+        pro2.submit_batch(shared, inputs, rule_a, rule_a["general_output_map"], value_output_map)
+        batch_a = pro2.current_batch_id(shared)
+        for n in range(args.workers):
+            workers.append(subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "pro2.py"), "--worker", shared, "--worker-id", f"w{n + 1}"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT))
+
+        # A 批次有任务正在处理时重新发布
+        wait_for(lambda: pro2.batch_status(shared)["claimed"] > 0, "A 批次开始处理")
+        pro2.submit_batch(shared, inputs, rule_b, rule_b["general_output_map"], value_output_map)
+        batch_b = pro2.current_batch_id(shared)
+        print(f"A 批次 {batch_a} 处理中时发布 B 批次 {batch_b}")
+
+        def finished():
+            status = pro2.batch_status(shared)
+            return status["done"] + status["failed"] == args.files and status["claimed"] == 0
+        started = time.time()
+        wait_for(finished, "B 批次完成")
+        print(f"B 批次 {args.files} 个任务完成，用时 {time.time() - started:.1f} 秒，"
+              f"状态：{pro2.batch_status(shared)}")
+
+        dirs = pro2.job_dirs(shared)
+        failed = pro2.batch_job_names(shared, "failed")
+        if failed:
+            problems.append(f"失败的任务：{failed}")
+        for key in ("done", "failed"):
+            stale = [n for n in os.listdir(dirs[key]) if n.startswith(batch_a)]
+            if stale:
+                problems.append(f"{key} 中混入了 A 批次的记录：{stale}")
+        leftover_outputs = [n for n in os.listdir(dirs["outputs"]) if n != batch_b]
+        if leftover_outputs:
+            problems.append(f"outputs 中残留其他批次的结果：{leftover_outputs}")
+
+        expected_dir = os.path.join(root, "expected")
+        os.makedirs(expected_dir)
+        for path in inputs:
+            metric = os.path.splitext(os.path.basename(path))[0]
+            out_name = pro2.build_output_name(rule_b["output_name_template"], path)
+            expected_path = os.path.join(expected_dir, out_name)
+            pro2.convert_file_job(path, expected_path, rule_b, rule_b["general_output_map"], value_output_map,
+                                  metric_name=metric)
+            got_path = os.path.join(dirs["outputs"], batch_b, out_name)
+            if not os.path.exists(got_path):
+                problems.append(f"缺少结果：{out_name}")
+                continue
+            got, expected = pd.read_excel(got_path), pd.read_excel(expected_path)
+            if value_output_map[metric] not in got.columns:
+                problems.append(f"{out_name} 的数据列名为 {list(got.columns)[-1]}，应为 {value_output_map[metric]}")
+            elif not got.equals(expected):
+                problems.append(f"{out_name} 与按规则 B 直接转换的结果不同")
+
+        for name in sorted(os.listdir(dirs["logs"])):
+            with open(os.path.join(dirs["logs"], name), "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            done = sum("完成" in line for line in lines)
+            dropped = sum("丢弃" in line for line in lines)
+            reloaded = any(f"已加载批次 {batch_b}" in line for line in lines)
+            print(f"  {name[:-4]}：完成 {done} 个，丢弃 {dropped} 个，重新加载规则：{'是' if reloaded else '否'}")
+    finally:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.wait()
+        if args.keep:
+            print(f"临时目录：{root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems:
+        print(f"[问题] {p}")
+    print("检查通过。" if not problems else f"发现 {len(problems)} 个问题。")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""本地转换服务的客户端检查：启动 pro2.py --serve，通过 HTTP 上传工作簿和规则并校验响应。
+
+用法：
+    python check_service.py                # 自动选择空闲端口启动服务并检查
+    python check_service.py --url http://127.0.0.1:8765   # 检查已在运行的服务
+
+同时也是调用示例：upload() 展示了其他脚本如何以 multipart/form-data 提交 file 与 rule 字段。
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import pro2  # noqa: E402
+
+STARTUP_TIMEOUT = 120
+
+
+def upload(url: str, filename: str, data: bytes, rule, output_format: str = "xlsx"):
+    """POST /convert，返回 (状态码, 响应头, 响应体)。rule 为 dict 或已编码的 JSON 文本。"""
+    boundary = uuid.uuid4().hex
+    rule_text = rule if isinstance(rule, str) else json.dumps(rule, ensure_ascii=False)
+    body = b"".join([
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"rule\"\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n\r\n".encode("utf-8"),
+        rule_text.encode("utf-8"), b"\r\n",
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8"),
+        data, f"\r\n--{boundary}--\r\n".encode("utf-8"),
+    ])
+    request = urllib.request.Request(f"{url}/convert?format={output_format}", data=body, method="POST",
+                                     headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    try:
+        with urllib.request.urlopen(request, timeout=pro2.SERVICE_REQUEST_TIMEOUT) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def start_service():
+    with socket.socket() as s:
+        s.bind((pro2.SERVICE_HOST, 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "pro2.py"), "--serve", "--port", str(port),
+                             "--workers", "2"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://{pro2.SERVICE_HOST}:{port}"
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("转换服务启动失败")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise TimeoutError("等待转换服务启动超时")
+
+
+def sample_workbook() -> bytes:
+    pd = pro2.pd
+    df = pd.DataFrame({"编号": ["A", "B", "C"], "2024-01": [1, 2, 3], "2024-02": [4, 5, 6]})
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def run_checks(url: str) -> list:
+    pd = pro2.pd
+    data = sample_workbook()
+    minimal = {"index_column": "编号", "selected_columns": ["2024-01", "2024-02"]}
+    problems = []
+
+    def expect(name, status, body, want_status, want_text=None):
+        text = body.decode("utf-8", "replace")
+        if status != want_status or (want_text and want_text not in text):
+            problems.append(f"{name}：状态 {status}，响应 {text[:200]}（期望 {want_status}"
+                            f"{'，包含 ' + want_text if want_text else ''}）")
+        else:
+            print(f"  通过：{name}")
+
+    # 只有必填字段、没有 general_output_map：按界面默认配置输出 序号/索引列/转换后列/数据列
+    status, headers, body = upload(url, "指标A.xlsx", data, minimal)
+    expect("最小规则", status, body, 200)
+    if status == 200:
+        out = pd.read_excel(io.BytesIO(body))
+        if list(out.columns) != ["序号", "编号", "日期", "指标A"] or len(out) != 6:
+            problems.append(f"最小规则：输出列 {list(out.columns)}、{len(out)} 行，"
+                            f"期望 ['序号', '编号', '日期', '指标A']、6 行")
+
+    rule = dict(minimal, value_column_alias="月份", enable_serial_number=False)
+    status, headers, body = upload(url, "指标A.xlsx", data, rule, "json")
+    expect("JSON 输出与默认字段映射", status, body, 200, '"月份"')
+    if status == 200 and "序号" in body.decode("utf-8"):
+        problems.append("关闭序号后输出中仍有序号列")
+
+    for field in pro2.SERVICE_RULE_REQUIRED:
+        broken = {k: v for k, v in minimal.items() if k != field}
+        status, _, body = upload(url, "指标A.xlsx", data, broken)
+        expect(f"缺少 {field}", status, body, 400, field)
+
+    status, _, body = upload(url, "指标A.xlsx", data, dict(minimal, selected_columns="2024-01"))
+    expect("selected_columns 类型错误", status, body, 400, "selected_columns")
+    status, _, body = upload(url, "指标A.xlsx", data, dict(minimal, expand_mode="sideways"))
+    expect("expand_mode 取值错误", status, body, 400, "expand_mode")
+    status, _, body = upload(url, "指标A.xlsx", data, "{not json")
+    expect("规则不是 JSON", status, body, 400, "规则 JSON 无效")
+    status, _, body = upload(url, "指标A.xlsx", data, dict(minimal, index_column="不存在"))
+    expect("索引列不存在", status, body, 422, "不存在")
+    return problems
+
+
+def worker_pids(service_pid: int) -> list:
+    """服务进程池中的工作进程（仅 Linux，通过 /proc 查找）。"""
+    pids = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == service_pid and b"spawn_main" in cmdline:
+            pids.append(int(name))
+    return pids
+
+
+def run_crash_checks(url: str, service_pid: int) -> list:
+    """转换进行中结束全部工作进程：该请求应得到 503，服务换用新的进程池后继续正常处理。"""
+    pd = pro2.pd
+    problems = []
+    minimal = {"index_column": "编号", "selected_columns": [f"c{i}" for i in range(20)]}
+    big = pd.DataFrame({"编号": [f"ID{i}" for i in range(20000)]})
+    for col in minimal["selected_columns"]:
+        big[col] = range(20000)
+    buf = io.BytesIO()
+    big.to_excel(buf, index=False)
+
+    result = {}
+
+    def send():
+        result["status"], _, result["body"] = upload(url, "大表.xlsx", buf.getvalue(), minimal)
+
+    request = threading.Thread(target=send)
+    request.start()
+    time.sleep(1.0)
+    killed = worker_pids(service_pid)
+    for pid in killed:
+        os.kill(pid, signal.SIGKILL)
+    request.join()
+    if not killed:
+        problems.append("未找到工作进程，无法检查进程池恢复")
+        return problems
+    if result.get("status") != 503:
+        problems.append(f"工作进程被结束时的请求：状态 {result.get('status')}，期望 503")
+    else:
+        print("  通过：工作进程异常退出时返回 503")
+
+    # 换用新进程池与该请求的 503 响应并行发生，稍等片刻再看 /health
+    deadline = time.time() + 5
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=5) as resp:
+                health = json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            health = json.loads(e.read())
+        if health.get("status") == "ok" or time.time() > deadline:
+            break
+        time.sleep(0.1)
+    if health.get("status") != "ok" or health.get("pool_restarts", 0) < 1:
+        problems.append(f"进程池恢复后的 /health：{health}")
+    status, _, body = upload(url, "指标A.xlsx", sample_workbook(),
+                             {"index_column": "编号", "selected_columns": ["2024-01", "2024-02"]})
+    if status != 200:
+        problems.append(f"进程池恢复后的请求：状态 {status}，响应 {body[:200]!r}")
+    else:
+        print("  通过：进程池恢复后请求正常")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查本地转换服务的请求校验与输出")
+    parser.add_argument("--url", help="已运行服务的地址；不指定时自动启动一个")
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if not url:
+        proc, url = start_service()
+    print(f"转换服务：{url}")
+    try:
+        problems = run_checks(url.rstrip("/"))
+        if proc is not None and os.path.isdir("/proc"):
+            problems += run_crash_checks(url.rstrip("/"), proc.pid)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    for p in problems:
+        print(f"[问题] {p}")
+    print("检查通过。" if not problems else f"发现 {len(problems)} 个问题。")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
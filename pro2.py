@@ -1,22 +1,1709 @@
+from __future__ import annotations
+
 import sys
 import os
 import json
+import argparse
+import io
+import fnmatch
+import hashlib
+import queue
+import re
+import signal
+import sqlite3
+import threading
+import time
 import warnings
+from datetime import date, datetime
 
 # 屏蔽 openpyxl 的默认样式警告，避免不必要的控制台输出
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
-import pandas as pd
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QTextEdit, QLabel, QFileDialog, QMessageBox,
-    QListWidget, QListWidgetItem, QLineEdit, QComboBox, QInputDialog,
-    QDialog, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QSplitter, QCheckBox
+    QListWidget, QListWidgetItem, QListView, QLineEdit, QComboBox, QInputDialog,
+    QDialog, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QSplitter, QCheckBox,
+    QSpinBox
+)
+from PyQt6.QtCore import (
+    QDateTime, Qt, QUrl, QTimer, QObject, QFileSystemWatcher, pyqtSignal,
+    QAbstractListModel, QModelIndex, QSortFilterProxyModel, QEvent
 )
-from PyQt6.QtCore import QDateTime, Qt, QUrl
 from PyQt6.QtGui import QDesktopServices, QDragEnterEvent, QDropEvent
 
 
+# --- 重量级依赖延迟导入：先显示窗口，pandas 等在首次使用或后台预热时再加载 ---
+class LazyModule:
+    """模块代理，首次访问属性时才调用 loader 真正导入模块。"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._module = None
+
+    def __getattr__(self, name):
+        if self._module is None:
+            self._module = self._loader()
+        return getattr(self._module, name)
+
+
+def _load_pandas():
+    # 使用显式 import 语句，PyInstaller 才能静态分析到依赖
+    import pandas
+    return pandas
+
+
+pd = LazyModule(_load_pandas)
+
+
+def preload_heavy_modules():
+    """在后台线程中预先导入 pandas 与 Excel 引擎，缩短首次转换的等待。"""
+    def _worker():
+        try:
+            import pandas  # noqa: F401
+            import openpyxl  # noqa: F401
+        except ImportError:
+            pass
+
+    thread = threading.Thread(target=_worker, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+# 重复索引聚合方式：(规则值, 界面显示文本)
+DUPLICATE_AGG_MODES = [
+    ("none", "保留重复行（不聚合）"),
+    ("sum", "求和"),
+    ("mean", "平均值"),
+    ("first", "取第一条"),
+    ("last", "取最后一条"),
+    ("count", "计数（非空）"),
+    ("concat", "拼接文本"),
+]
+CONCAT_SEPARATOR = "、"
+
+
+def normalize_excel_cell(value):
+    # 与 pandas 读取 openpyxl 时的处理一致：整数值的浮点数转为 int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def join_group_values(values: pd.Series):
+    """拼接同一 ID 的非空值；整数值的浮点数按整数输出，全为空时返回 NaN。"""
+    parts = [str(normalize_excel_cell(v)) for v in values.dropna()]
+    return CONCAT_SEPARATOR.join(parts) if parts else float("nan")
+
+
+def aggregate_duplicate_ids(df: pd.DataFrame, id_col: str, value_cols: list, how: str) -> pd.DataFrame:
+    """按索引列对重复 ID 做分组聚合，每个 ID 只保留一行，顺序按首次出现的位置。"""
+    if not how or how == "none":
+        return df
+    # 只有 first/last 在没有重复 ID 时等同于原表；计数、求和、平均和拼接即使每组一行也要转换取值
+    if how in ("first", "last") and not df[id_col].duplicated().any():
+        return df
+    block = df[[id_col] + value_cols]
+    if how in ("sum", "mean"):
+        block = block.assign(**{c: pd.to_numeric(block[c], errors="coerce") for c in value_cols})
+    grouped = block.groupby(id_col, sort=False, dropna=False)[value_cols]
+    if how == "sum":
+        result = grouped.sum(min_count=1)
+    elif how == "mean":
+        result = grouped.mean()
+    elif how == "first":
+        result = grouped.first()
+    elif how == "last":
+        result = grouped.last()
+    elif how == "count":
+        result = grouped.count()
+    elif how == "concat":
+        result = grouped.agg(join_group_values)
+    else:
+        raise ValueError(f"未知的重复索引聚合方式：{how}")
+    return result.reset_index()
+
+
+# 转换后列（value 列）的类型：(规则值, 界面显示文本)
+VALUE_COLUMN_TYPES = [
+    ("text", "文本（原样）"),
+    ("date", "日期"),
+    ("number", "数字"),
+]
+EXCEL_DATE_FORMAT = "YYYY-MM-DD"
+# 格式输入框的提示文本，随类型切换
+VALUE_FORMAT_HINTS = {
+    "text": "文本类型无需格式",
+    "date": "格式，如 %Y-%m-%d（留空自动识别）",
+    "number": "格式，如 第%d周、%f万（留空自动识别）",
+}
+# 数字格式中的占位符：%d 为整数，%f 为可带小数的数字；允许千分位逗号
+NUMBER_FORMAT_PLACEHOLDERS = {
+    "%d": r"([+-]?[\d,]+)",
+    "%f": r"([+-]?(?:[\d,]+(?:\.\d*)?|\.\d+))",
+}
+
+
+def number_format_pattern(fmt: str) -> str:
+    """把 第%d周 这类数字格式转为正则，占位符以外的字符按原样匹配；格式中必须恰好有一个占位符。"""
+    parts = re.split(r"(%[df])", fmt)
+    placeholders = parts[1::2]
+    if len(placeholders) != 1:
+        raise ValueError(f"数字格式需要恰好一个 %d 或 %f 占位符：{fmt}")
+    return "".join(NUMBER_FORMAT_PLACEHOLDERS[p] if i % 2 else re.escape(p) for i, p in enumerate(parts))
+
+
+def parse_header_values(headers, value_type: str, fmt: str = ""):
+    """把选中的列名一次性解析为日期或数字向量；有无法解析的列名时报错，避免结果中混入空值。
+    日期格式为 strftime 格式；数字格式如 第%d周，从列名中取出占位符对应的数字。"""
+    raw = pd.Series(list(headers), dtype=object).astype(str).str.strip()
+    if value_type == "date":
+        parsed = pd.to_datetime(raw, format=fmt or "mixed", errors="coerce")
+        type_text = "日期"
+    elif value_type == "number":
+        numbers = raw.str.extract(f"^{number_format_pattern(fmt)}$", expand=False) if fmt else raw
+        parsed = pd.to_numeric(numbers.str.replace(",", "", regex=False), errors="coerce")
+        type_text = "数字"
+    else:
+        raise ValueError(f"未知的转换后列类型：{value_type}")
+    bad = raw[parsed.isna()].tolist()
+    if bad:
+        more = " 等" if len(bad) > 10 else ""
+        raise ValueError(f"以下列名无法解析为{type_text}（格式：{fmt or '自动'}）：{'、'.join(bad[:10])}{more}")
+    return parsed.to_numpy()
+
+
+def write_output_excel(out_df: pd.DataFrame, out_path: str, rule: dict = None):
+    """写出转换结果；转换后列为日期类型时，日期单元格使用 YYYY-MM-DD 显示格式。"""
+    if rule and rule.get("value_column_type") == "date":
+        # pandas 的 openpyxl 写出会忽略 datetime_format，这里写出后直接设置单元格格式
+        with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+            out_df.to_excel(writer, index=False)
+            sheet = next(iter(writer.sheets.values()))
+            for i, dtype in enumerate(out_df.dtypes, start=1):
+                if not pd.api.types.is_datetime64_any_dtype(dtype):
+                    continue
+                for (cell,) in sheet.iter_rows(min_row=2, min_col=i, max_col=i):
+                    cell.number_format = EXCEL_DATE_FORMAT
+    else:
+        out_df.to_excel(out_path, index=False, engine="openpyxl")
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".kuanbiao_cache")
+DEFAULT_CACHE_LIMIT_MB = 2048
+# 缓存文件格式变化时递增，旧格式的条目不再命中，由 LRU 淘汰
+CACHE_FORMAT_VERSION = 2
+
+
+def excel_engine_for(path: str) -> str:
+    return 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
+
+
+class SheetCache:
+    """已解析工作表的磁盘列式缓存（Arrow/Feather）。
+
+    以 路径 + 文件大小 + 修改时间 + 工作表 作为键。文件不压缩写入，命中时以内存映射方式读取，
+    数值列直接引用映射的页面而不必先解压到内存；目录总大小超过上限时按最近使用时间（LRU）淘汰。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_LIMIT_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import pyarrow.feather  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def entry_path(self, path: str, sheet=0) -> str:
+        st = os.stat(path)
+        raw = f"{CACHE_FORMAT_VERSION}|{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{sheet}"
+        return os.path.join(self.cache_dir, hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".feather")
+
+    def load(self, path: str, sheet=0):
+        entry = self.entry_path(path, sheet)
+        if not os.path.exists(entry):
+            return None
+        from pyarrow import feather
+        table = feather.read_table(entry, memory_map=True)
+        os.utime(entry)  # 刷新访问时间，供 LRU 淘汰使用
+        df = table.to_pandas()
+        # Arrow 的空值在 object 列中还原为 None，而 read_excel 得到 NaN；
+        # 两者写入单元格时分别为 "None" 和 "nan"，这里统一为 NaN 以与直接读取一致
+        for col in df.columns[df.dtypes == object]:
+            missing = df[col].isna().to_numpy()
+            if missing.any():
+                values = df[col].to_numpy(dtype=object, copy=True)
+                values[missing] = float("nan")
+                df[col] = values
+        return df
+
+    @staticmethod
+    def mixed_type_columns(df: pd.DataFrame) -> dict:
+        """返回 {列名: 类型名列表}，列出同时含多种值类型（如数字与“合计”文本）的 object 列。"""
+        mixed = {}
+        for col in df.columns[df.dtypes == object]:
+            types = {type(v).__name__ for v in df[col].dropna()}
+            if len(types) > 1:
+                mixed[col] = sorted(types)
+        return mixed
+
+    def store(self, path: str, df: pd.DataFrame, sheet=0):
+        """写入缓存，成功返回 None。Arrow 无法原样保存混合类型列，此时不缓存并返回原因。"""
+        from pyarrow import feather
+        mixed = self.mixed_type_columns(df)
+        if mixed:
+            detail = "；".join(f"{c}（{'、'.join(t)}）" for c, t in list(mixed.items())[:5])
+            return f"以下列含混合类型，无法无损缓存：{detail}"
+        entry = self.entry_path(path, sheet)
+        tmp = entry + ".tmp"
+        try:
+            to_save = df.copy(deep=False)
+            to_save.columns = [str(c) for c in to_save.columns]
+            # 默认的 LZ4 压缩会让内存映射读取仍需解压到堆内存
+            feather.write_feather(to_save.reset_index(drop=True), tmp, compression="uncompressed")
+            os.replace(tmp, entry)
+        except Exception as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return str(e)
+        self.evict()
+        return None
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".feather"):
+                continue
+            full = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, full))
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".feather", ".tmp")):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def read_excel_cached(path: str, cache: SheetCache = None, sheet=0, on_skip=None):
+    """读取 Excel 工作表；提供 cache 时优先从列式缓存读取。返回 (DataFrame, 是否命中缓存)。
+    无法写入缓存时调用 on_skip(原因)。"""
+    if cache is not None:
+        df = cache.load(path, sheet)
+        if df is not None:
+            return df, True
+    df = pd.read_excel(path, sheet_name=sheet, engine=excel_engine_for(path))
+    if cache is not None:
+        reason = cache.store(path, df, sheet)
+        if reason and on_skip:
+            on_skip(reason)
+    return df, False
+
+
+def convert_dataframe(df: pd.DataFrame, rule: dict, metric_name: str,
+                      general_output_map: dict = None, value_output_map: dict = None,
+                      serial_start: int = 1) -> pd.DataFrame:
+    """按规则把宽表转换为长表；不依赖界面，可在后台线程或无界面进程中调用。"""
+    id_col = rule["index_column"]
+    selected_cols_from_rule = rule["selected_columns"]
+
+    if id_col not in df.columns:
+        raise ValueError(f"索引列 '{id_col}' 不存在于当前文件中。")
+    df.columns = [str(c).strip() for c in df.columns]
+
+    value_cols = [c for c in selected_cols_from_rule if c in df.columns and c != id_col]
+    if not value_cols:
+        raise ValueError("没有可用的列进行展开。")
+
+    value_name = rule["value_column_alias"]
+    index_alias = rule["index_alias"] or id_col
+
+    df = aggregate_duplicate_ids(df, id_col, value_cols, rule.get("duplicate_agg", "none"))
+
+    # melt 合并各列时会忽略全为空的列的类型，结果随数据内容变化；先按列类型统一为公共类型
+    dtypes = {df[c].dtype for c in value_cols}
+    if len(dtypes) > 1:
+        common = "float64" if all(t.kind in "iuf" for t in dtypes) else object
+        df = df.astype({c: common for c in value_cols if df[c].dtype != common})
+
+    melted = pd.melt(df, id_vars=[id_col], value_vars=value_cols,
+                     var_name=value_name, value_name=metric_name)
+    if melted[metric_name].dtype != df[value_cols[0]].dtype:
+        # melt 会对 object 结果重新推断类型（如非空值恰好都是日期时），按原列类型重建数据列
+        melted[metric_name] = pd.concat([df[c] for c in value_cols], ignore_index=True)
+
+    # melt 的结果按“列块”排列，用行位置而不是 ID 值排序，重复 ID 也能保持原始顺序
+    n_rows = len(df)
+    melted["_idx_order"] = melted.index % n_rows if n_rows else 0
+    melted["_val_order"] = melted.index // n_rows if n_rows else 0
+    if rule["expand_mode"] == "index_then_value":
+        sort_keys = ["_idx_order", "_val_order"]
+    else:
+        sort_keys = ["_val_order", "_idx_order"]
+    melted = melted.sort_values(by=sort_keys, kind="stable").reset_index(drop=True)
+
+    # 列名只解析一次，再按列位置广播到每一行，得到真正的日期/数字列
+    value_type = rule.get("value_column_type", "text")
+    if value_type != "text":
+        typed = parse_header_values(value_cols, value_type, rule.get("value_column_format", ""))
+        melted[value_name] = typed[melted["_val_order"].to_numpy()]
+    melted.drop(columns=["_idx_order", "_val_order"], inplace=True)
+
+    melted = melted.rename(columns={id_col: index_alias})
+
+    if rule.get("enable_trim_and_prefix", True):
+        data_prefix = rule.get("data_prefix", "#")
+        target_cols = [index_alias, metric_name]
+        for col in target_cols:
+            if col in melted.columns:
+                melted[col] = melted[col].astype(str).apply(
+                    lambda x: (data_prefix * (len(x) - len(x.lstrip()))) + x.lstrip()
+                )
+
+    # 优先使用规则中保存的 general_output_map
+    if rule.get("general_output_map"):
+        output_col_map = rule["general_output_map"].copy()
+    else:
+        output_col_map = dict(general_output_map or {})
+
+    value_col_new_name = (value_output_map or {}).get(os.path.splitext(metric_name)[0], metric_name)
+
+    # 新增“可配置字段”这一列的映射
+    output_col_map["可配置字段"] = value_col_new_name
+
+    output_df = pd.DataFrame()
+    final_columns = list(output_col_map.values())
+    output_df = pd.DataFrame(columns=final_columns)
+
+    for original_name, new_name in output_col_map.items():
+        if original_name == "序号":
+            if rule.get("enable_serial_number"):
+                output_df[new_name] = range(serial_start, serial_start + len(melted))
+        elif original_name == "索引列名":
+            output_df[new_name] = melted[index_alias]
+        elif original_name == "转换后列名":
+            output_df[new_name] = melted[value_name]
+        elif original_name == "可配置字段":
+            output_df[new_name] = melted[metric_name]
+        else:
+            if original_name in melted.columns:
+                output_df[new_name] = melted[original_name]
+            else:
+                output_df[new_name] = pd.NA
+    return output_df
+
+
+def build_output_name(template: str, path: str) -> str:
+    basename = os.path.splitext(os.path.basename(path))[0]
+    out_name = (template or "清洗_{basename}.xlsx").format(basename=basename)
+    return out_name if out_name.lower().endswith(".xlsx") else out_name + ".xlsx"
+
+
+# --- 内存预算调度：按文件估算内存占用，选择整表处理或分块流式处理，并控制并发数 ---
+DEFAULT_MEMORY_BUDGET_MB = 2048
+BYTES_PER_CELL = 64          # object 列中单元格的大致开销（指针 + Python 对象）
+LONG_TABLE_COLUMNS = 4       # 序号、索引、转换后列、数据列
+RESHAPE_COPIES = 3           # melt、排序、组装输出各产生一份长表
+XLSX_EXPANSION = 20          # 无法读取维度信息时，按压缩文件大小粗略放大
+CHUNK_MIN_ROWS = 1000
+
+
+def probe_workbook(path: str) -> dict:
+    """不完整解析文件，只读取表头和行列数。"""
+    if path.lower().endswith(".xls"):
+        import xlrd
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            header = sheet.row_values(0) if sheet.nrows else []
+            n_rows, n_cols = max(sheet.nrows - 1, 0), sheet.ncols
+        finally:
+            book.release_resources()
+    else:
+        from openpyxl import load_workbook
+        book = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = book.worksheets[0]
+            first = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            header = list(first)
+            while header and header[-1] is None:
+                header.pop()
+            n_cols = len(header)
+            n_rows = sheet.max_row - 1 if sheet.max_row else None
+        finally:
+            book.close()
+    return {
+        "header": [str(c).strip() for c in header],
+        "rows": n_rows,
+        "columns": n_cols,
+        "file_size": os.path.getsize(path),
+    }
+
+
+class MemoryGovernor:
+    """根据内存预算为每个文件选择执行策略，并决定同时处理的文件数。
+
+    in_memory：整表读入后转换（原有流程，支持所有规则选项）。
+    chunked：按行分块流式读取 xlsx、逐块转换并以 write_only 方式写出；
+    只在“按索引先展开”且不聚合重复索引时可用，因为此时分块不会改变结果。
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024, max_workers: int = None):
+        self.budget_bytes = budget_bytes
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+
+    def per_row_bytes(self, n_cols: int, n_values: int) -> int:
+        wide = n_cols * BYTES_PER_CELL
+        long = n_values * LONG_TABLE_COLUMNS * BYTES_PER_CELL
+        return wide + RESHAPE_COPIES * long
+
+    def plan_file(self, path: str, rule: dict) -> dict:
+        info = probe_workbook(path)
+        n_cols = max(info["columns"], 1)
+        selected = set(rule.get("selected_columns") or [])
+        n_values = len([c for c in info["header"] if c in selected and c != rule.get("index_column")]) or n_cols
+        per_row = self.per_row_bytes(n_cols, n_values)
+        rows = info["rows"]
+        if rows is None:
+            rows = info["file_size"] * XLSX_EXPANSION // (n_cols * BYTES_PER_CELL)
+        peak = rows * per_row
+
+        chunkable = (not path.lower().endswith(".xls")
+                     and rule.get("expand_mode") == "index_then_value"
+                     and rule.get("duplicate_agg", "none") == "none")
+        plan = dict(info, path=path, estimated_rows=rows, peak_bytes=peak,
+                    strategy="in_memory", chunk_rows=None, over_budget=False)
+        if peak > self.budget_bytes:
+            if chunkable:
+                # 分块处理时单个文件最多占用预算的四分之一，其余留给并发任务
+                chunk_rows = max(CHUNK_MIN_ROWS, self.budget_bytes // 4 // per_row)
+                plan.update(strategy="chunked", chunk_rows=chunk_rows, peak_bytes=chunk_rows * per_row)
+            else:
+                plan["over_budget"] = True
+        return plan
+
+    def run(self, jobs, on_done, poll=None):
+        """执行 (plan, 任务参数) 列表。同时运行的任务估算占用之和不超过预算；
+        超出预算且无法分块的任务单独运行。on_done(plan, convert_file_job 的结果, 异常) 在主线程中回调。"""
+        if len(jobs) <= 1 or self.max_workers <= 1:
+            for plan, args in jobs:
+                try:
+                    on_done(plan, convert_file_job(*args), None)
+                except Exception as e:
+                    on_done(plan, None, e)
+                if poll:
+                    poll()
+            return
+
+        import multiprocessing
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
+        pending = sorted(jobs, key=lambda j: j[0]["peak_bytes"])
+        running = {}
+        # 使用 spawn 避免在已创建 Qt 对象的进程中 fork
+        ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        try:
+            while pending or running:
+                in_use = sum(plan["peak_bytes"] for plan in running.values())
+                broken = None
+                try:
+                    while pending and len(running) < self.max_workers:
+                        plan, args = pending[0]
+                        if running and in_use + plan["peak_bytes"] > self.budget_bytes:
+                            break
+                        running[pool.submit(convert_file_job, *args)] = plan
+                        pending.pop(0)
+                        in_use += plan["peak_bytes"]
+                except BrokenProcessPool as e:
+                    broken = e
+                done, _ = wait(list(running), timeout=0.1, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    plan = running.pop(fut)
+                    try:
+                        on_done(plan, fut.result(), None)
+                    except BrokenProcessPool as e:
+                        broken = e
+                        on_done(plan, None, e)
+                    except Exception as e:
+                        on_done(plan, None, e)
+                if broken is not None:
+                    # 某个子进程异常退出（如被系统因内存不足结束）后整个进程池不可用：
+                    # 正在运行的任务都报告失败，其余待处理的任务换一个新的进程池继续
+                    for fut, plan in running.items():
+                        on_done(plan, None, broken)
+                    running.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+                if poll:
+                    poll()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def read_xlsx_cell(cell):
+    # 与 pandas 的 openpyxl 读取器一致：空单元格为 ""，错误值为 NaN，整数值的数字转为 int
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return float("nan")
+    if cell.data_type == TYPE_NUMERIC and not isinstance(value, bool):
+        return normalize_excel_cell(value)
+    return value
+
+
+def iter_xlsx_rows(path: str, n_cols: int):
+    """逐行读取首个工作表的数据行（不含表头）。中间的空行保留，末尾的空行丢弃，与 read_excel 相同。"""
+    from openpyxl import load_workbook
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()  # 不信任文件记录的维度，读到最后一行
+        blank_rows = []
+        for row in sheet.iter_rows(min_row=2):
+            values = [read_xlsx_cell(c) for c in row[:n_cols]]
+            values.extend([""] * (n_cols - len(values)))
+            if all(v == "" for v in values):
+                blank_rows.append(values)
+                continue
+            yield from blank_rows
+            blank_rows = []
+            yield values
+    finally:
+        book.close()
+
+
+def parse_xlsx_rows(rows, columns, dtype=None) -> pd.DataFrame:
+    # 与 read_excel 相同的方式把单元格值解析为 DataFrame（空值识别、数值和布尔推断）
+    from pandas.io.parsers import TextParser
+    return TextParser(rows, names=columns, header=None, dtype=dtype, skip_blank_lines=False).read()
+
+
+def iter_xlsx_chunk_rows(path: str, columns: list, chunk_rows: int):
+    buf = []
+    for values in iter_xlsx_rows(path, len(columns)):
+        buf.append(values)
+        if len(buf) >= chunk_rows:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+BOOL_TRUE_TEXT = {"True", "TRUE", "true"}
+
+
+def is_bool_column(series: pd.Series) -> bool:
+    # 文本 True/False 与空值混合时，解析器得到的是由 bool 和 NaN 组成的 object 列
+    values = series.dropna()
+    return series.dtype == object and len(values) > 0 and all(isinstance(v, bool) for v in values)
+
+
+def object_series(series: pd.Series, convert) -> pd.Series:
+    # 逐个转换非空值，空值统一为 NaN；结果保持 object 类型，不再推断数值或日期
+    values = [float("nan") if pd.isna(v) else convert(v) for v in series]
+    return pd.Series(values, index=series.index, dtype=object, name=series.name)
+
+
+def infer_sheet_dtypes(path: str, columns: list, chunk_rows: int) -> dict:
+    """第一遍：逐块推断列类型，并为每列保留能决定整表推断结果的少量样本值，
+    再用同样的解析器对样本推断，得到与整表读取一致的列类型。
+    返回 {列名: dtype}，其中含空值的布尔列记为 "bool_na"。"""
+    samples = {c: {} for c in columns}
+    object_cols = set()
+    for rows in iter_xlsx_chunk_rows(path, columns, chunk_rows):
+        df = parse_xlsx_rows(rows, columns)
+        for i, col in enumerate(columns):
+            if col in object_cols:
+                continue
+            series = df[col]
+            if series.dtype == object and not is_bool_column(series):
+                # 无法转换为数值、布尔或日期的列，整表也只能是 object
+                object_cols.add(col)
+                continue
+            kept = samples[col]
+            missing = series.isna()
+            if missing.any():
+                kept.setdefault("nan", float("nan"))
+            # 同类块中同一类型的值对推断结果的作用相同，按（块类型, 值类型）各保留一个；
+            # 数字文本再区分是否为整数，以保留“本块为浮点数”的原因
+            for values, is_missing in zip(rows, missing):
+                if not is_missing:
+                    v = values[i]
+                    key = (series.dtype.kind, type(v).__name__)
+                    if isinstance(v, str) and series.dtype.kind == "f":
+                        key += (v.strip().lstrip("+-").isdigit(),)
+                    kept.setdefault(key, v)
+    dtypes = {c: object for c in object_cols}
+    for col, kept in samples.items():
+        if col not in object_cols and kept:
+            series = parse_xlsx_rows([[v] for v in kept.values()], [col])[col]
+            dtypes[col] = "bool_na" if is_bool_column(series) else series.dtype
+    return dtypes
+
+
+def iter_xlsx_chunks(path: str, chunk_rows: int):
+    """以 openpyxl 只读模式逐块读取首个工作表，每块返回一个 DataFrame。
+    读取两遍：第一遍确定整表的列类型，第二遍按该类型解析每块，
+    因此结果与 read_excel 整表读取后按行切分相同，不受分块边界影响。"""
+    columns = list(pd.read_excel(path, nrows=0, engine="openpyxl").columns)
+    dtypes = infer_sheet_dtypes(path, columns, chunk_rows)
+    # object 列与布尔列按原值读取，避免在单个块内被推断为数值
+    raw_cols = {c: object for c, dtype in dtypes.items() if dtype == object or dtype == "bool_na"}
+    # 解析器在 object 列中把相等的值替换为首次出现的值（如 1 与 True），跨块保留这份记录
+    memos = {c: {} for c, dtype in dtypes.items() if dtype == object}
+    for rows in iter_xlsx_chunk_rows(path, columns, chunk_rows):
+        df = parse_xlsx_rows(rows, columns, raw_cols or None)
+        for col, dtype in dtypes.items():
+            if dtype == "bool_na":
+                df[col] = object_series(df[col], lambda v: v if isinstance(v, bool) else v in BOOL_TRUE_TEXT)
+            elif col in memos:
+                memo = memos[col]
+                df[col] = object_series(df[col], lambda v: memo.setdefault(v, v) if isinstance(v, (int, float)) else v)
+            elif df[col].dtype != dtype:
+                df[col] = df[col].astype(object).astype(dtype)
+        yield df
+
+
+def convert_file_chunked(path, out_path, rule, general_output_map, value_output_map, chunk_rows,
+                         metric_name: str = None) -> int:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    metric_name = metric_name or os.path.splitext(os.path.basename(path))[0]
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet("Sheet1")
+    written = 0
+
+    def date_cell(value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = EXCEL_DATE_FORMAT
+        return cell
+
+    for chunk in iter_xlsx_chunks(path, chunk_rows):
+        out_df = convert_dataframe(chunk, rule, metric_name, general_output_map, value_output_map,
+                                   serial_start=written + 1)
+        if written == 0:
+            sheet.append([str(c) for c in out_df.columns])
+        date_cols = {i for i, dtype in enumerate(out_df.dtypes) if pd.api.types.is_datetime64_any_dtype(dtype)}
+        for row in out_df.itertuples(index=False, name=None):
+            sheet.append([None if pd.isna(v) else date_cell(v) if i in date_cols else v
+                          for i, v in enumerate(row)])
+        written += len(out_df)
+    book.save(out_path)
+    return written
+
+
+def convert_file_job(path, out_path, rule, general_output_map=None, value_output_map=None,
+                     strategy="in_memory", chunk_rows=None, cache_dir=None, cache_limit_bytes=None,
+                     metric_name: str = None) -> dict:
+    """转换单个文件并写出，返回 {"rows": 输出行数, "cache_note": 未能缓存的原因或 None}。
+    metric_name 为数据列名（也用于查找 value_output_map），默认取输入文件名；
+    输入文件被复制改名时（如共享文件夹任务）需显式传入原文件名。
+    位于模块顶层，可在子进程中执行。"""
+    metric_name = metric_name or os.path.splitext(os.path.basename(path))[0]
+    if strategy == "chunked":
+        rows = convert_file_chunked(path, out_path, rule, general_output_map, value_output_map, chunk_rows,
+                                    metric_name)
+        return {"rows": rows, "cache_note": None}
+    cache = SheetCache(cache_dir, cache_limit_bytes) if cache_dir else None
+    notes = []
+    df, _ = read_excel_cached(path, cache, on_skip=notes.append)
+    out_df = convert_dataframe(df, rule, metric_name, general_output_map, value_output_map)
+    write_output_excel(out_df, out_path, rule)
+    return {"rows": len(out_df), "cache_note": notes[0] if notes else None}
+
+
+# --- SQLite 导出：所有文件的转换结果写入同一张表，以“指标”列区分来源文件 ---
+SQLITE_METRIC_COLUMN = "指标"
+SQLITE_VALUE_COLUMN = "数值"
+SQLITE_DEFAULT_TABLE = "long_table"
+SQLITE_BATCH_ROWS = 50000
+
+
+def quote_ident(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sqlite_value(value):
+    # NaN / None / NaT / pd.NA 统一写为 NULL，日期时间写为 ISO 文本
+    if value is None or pd.isna(value) is True:
+        return None
+    if isinstance(value, datetime):
+        # 只有日期部分时写为 YYYY-MM-DD，便于按日期比较和排序
+        if (value.hour, value.minute, value.second, value.microsecond) == (0, 0, 0, 0):
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class SqliteLongTableWriter:
+    """批量写入长表到 SQLite。
+
+    整个导出在一个事务内完成，写入期间关闭同步并把日志放在内存中；
+    索引在数据全部写入后再建立，比边插入边维护索引快得多。
+    """
+
+    def __init__(self, db_path: str, table: str, index_column: str, value_column: str):
+        self.db_path = db_path
+        self.table = table
+        self.index_column = index_column
+        self.value_column = value_column
+        self.columns = None
+        self.rows_written = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=MEMORY")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-262144")
+        self.conn.execute("BEGIN")
+        self.conn.execute(f"DROP TABLE IF EXISTS {quote_ident(self.table)}")
+
+    def append(self, out_df: pd.DataFrame, metric_column: str, metric_label: str):
+        base_cols = [c for c in out_df.columns if c != metric_column]
+        if self.columns is None:
+            self.columns = base_cols + [SQLITE_METRIC_COLUMN, SQLITE_VALUE_COLUMN]
+            # 索引、转换后列和指标列声明为 TEXT 便于按键查询，其余列不声明类型以保留原始数字/文本
+            text_cols = {self.index_column, self.value_column, SQLITE_METRIC_COLUMN}
+            col_defs = ", ".join(f"{quote_ident(c)} TEXT" if c in text_cols else quote_ident(c)
+                                 for c in self.columns)
+            self.conn.execute(f"CREATE TABLE {quote_ident(self.table)} ({col_defs})")
+        elif base_cols + [SQLITE_METRIC_COLUMN, SQLITE_VALUE_COLUMN] != self.columns:
+            raise ValueError("输出字段与已写入的数据不一致，无法写入同一张表。")
+
+        placeholders = ", ".join("?" * len(self.columns))
+        sql = f"INSERT INTO {quote_ident(self.table)} VALUES ({placeholders})"
+        ordered = out_df[base_cols + [metric_column]].astype(object)
+        for start in range(0, len(ordered), SQLITE_BATCH_ROWS):
+            block = ordered.iloc[start:start + SQLITE_BATCH_ROWS]
+            self.conn.executemany(sql, (
+                [sqlite_value(v) for v in row[:-1]] + [metric_label, sqlite_value(row[-1])]
+                for row in block.itertuples(index=False, name=None)
+            ))
+        self.rows_written += len(ordered)
+
+    def finish(self):
+        self.conn.execute("COMMIT")
+        if self.columns:
+            table = quote_ident(self.table)
+            for suffix, cols in (("id_value", [self.index_column, self.value_column]),
+                                 ("value", [self.value_column]),
+                                 ("metric", [SQLITE_METRIC_COLUMN])):
+                cols = [c for c in cols if c in self.columns]
+                if not cols:
+                    continue
+                name = quote_ident(f"idx_{self.table}_{suffix}")
+                self.conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(quote_ident(c) for c in cols)})")
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+        self.conn.close()
+
+    def abort(self):
+        try:
+            self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+# --- 分布式批量处理：协调端在共享文件夹中发布任务，多台机器上的无界面 worker 认领并转换 ---
+# 共享文件夹结构：
+#   batch.json          规则及输出字段映射
+#   inputs/             不在共享文件夹内的输入文件会先复制到这里
+#   jobs/pending/       待处理任务 <job_id>.json
+#   jobs/claimed/       已认领任务 <job_id>@<worker_id>.json，文件修改时间即心跳
+#   jobs/done/          成功结果；jobs/failed/ 失败结果
+#   outputs/            转换后的 xlsx
+#   logs/               各 worker 的日志
+JOB_STALE_SECONDS = 120
+JOB_HEARTBEAT_SECONDS = 15
+JOB_POLL_SECONDS = 2.0
+
+
+def job_dirs(shared: str) -> dict:
+    jobs = os.path.join(shared, "jobs")
+    return {
+        "pending": os.path.join(jobs, "pending"),
+        "claimed": os.path.join(jobs, "claimed"),
+        "done": os.path.join(jobs, "done"),
+        "failed": os.path.join(jobs, "failed"),
+        "inputs": os.path.join(shared, "inputs"),
+        "outputs": os.path.join(shared, "outputs"),
+        "logs": os.path.join(shared, "logs"),
+    }
+
+
+def write_json_atomic(path: str, data: dict, tag: str = None):
+    import socket
+    # 临时文件名带上 worker 标识：不同机器上的进程号可能相同，会写到同一个临时文件
+    tmp = f"{path}.{tag or f'{socket.gethostname()}-{os.getpid()}'}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def read_batch(shared: str) -> dict:
+    with open(os.path.join(shared, "batch.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def current_batch_id(shared: str):
+    try:
+        return read_batch(shared).get("batch_id")
+    except (OSError, ValueError):
+        return None
+
+
+def submit_batch(shared: str, input_files, rule: dict, general_output_map=None, value_output_map=None,
+                 output_names=None) -> int:
+    """发布一批任务，返回任务数。
+
+    每批任务有唯一的批次号，任务编号以批次号开头。旧批次未认领的任务和结果记录会被清除；
+    正在处理的旧任务不受影响，worker 完成后发现批次已被替换会丢弃其结果。"""
+    import shutil
+    import uuid
+    dirs = job_dirs(shared)
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    batch_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    # 先写 batch.json：worker 认领到新批次的任务时，总能读到对应的规则
+    write_json_atomic(os.path.join(shared, "batch.json"), {
+        "batch_id": batch_id,
+        "rule": rule,
+        "general_output_map": general_output_map or {},
+        "value_output_map": value_output_map or {},
+        "created": datetime.now().isoformat(sep=" ", timespec="seconds"),
+    })
+    for key in ("pending", "done", "failed"):
+        for name in os.listdir(dirs[key]):
+            try:
+                os.remove(os.path.join(dirs[key], name))
+            except OSError:
+                pass  # 已被 worker 认领或正在写入，按旧批次处理
+    for key in ("inputs", "outputs"):
+        for name in os.listdir(dirs[key]):
+            if os.path.isdir(os.path.join(dirs[key], name)):
+                shutil.rmtree(os.path.join(dirs[key], name), ignore_errors=True)
+    os.makedirs(os.path.join(dirs["inputs"], batch_id))
+    os.makedirs(os.path.join(dirs["outputs"], batch_id))
+
+    shared_abs = os.path.abspath(shared)
+    for i, path in enumerate(input_files):
+        src = os.path.abspath(path)
+        if os.path.commonpath([src, shared_abs]) == shared_abs:
+            rel_input = os.path.relpath(src, shared_abs)
+        else:
+            name = f"{i:06d}_{os.path.basename(src)}"
+            shutil.copy2(src, os.path.join(dirs["inputs"], batch_id, name))
+            rel_input = os.path.join("inputs", batch_id, name)
+        if output_names and i < len(output_names) and output_names[i]:
+            out_name = output_names[i]
+        else:
+            out_name = build_output_name(rule.get("output_name_template"), src)
+        job_id = f"{batch_id}-{i:06d}"
+        write_json_atomic(os.path.join(dirs["pending"], f"{job_id}.json"), {
+            "batch_id": batch_id,
+            "job_id": job_id,
+            "input": rel_input.replace(os.sep, "/"),
+            "metric_name": os.path.splitext(os.path.basename(src))[0],
+            "output": out_name,
+        })
+    return len(input_files)
+
+
+def batch_job_names(shared: str, key: str, batch_id=None) -> list:
+    """返回 pending/claimed/done/failed 目录中属于当前批次的任务文件名。"""
+    batch_id = batch_id or current_batch_id(shared)
+    prefix = f"{batch_id}-" if batch_id else ""
+    try:
+        return sorted(n for n in os.listdir(job_dirs(shared)[key]) if n.endswith(".json") and n.startswith(prefix))
+    except FileNotFoundError:
+        return []
+
+
+def batch_status(shared: str) -> dict:
+    """当前批次各状态的任务数；旧批次残留的文件不计入。"""
+    batch_id = current_batch_id(shared)
+    return {key: len(batch_job_names(shared, key, batch_id)) for key in ("pending", "claimed", "done", "failed")}
+
+
+def requeue_stale_jobs(shared: str, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+    """心跳超时的已认领任务放回待处理队列。rename 是原子的，多个进程同时执行也只有一个成功。"""
+    dirs = job_dirs(shared)
+    now = time.time()
+    requeued = 0
+    try:
+        names = os.listdir(dirs["claimed"])
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        claimed = os.path.join(dirs["claimed"], name)
+        try:
+            if now - os.path.getmtime(claimed) < stale_seconds:
+                continue
+            job_id = name.split("@", 1)[0]
+            os.rename(claimed, os.path.join(dirs["pending"], f"{job_id}.json"))
+            requeued += 1
+        except OSError:
+            continue
+    return requeued
+
+
+def claim_job(shared: str, worker_id: str):
+    """原子地认领一个待处理任务，返回 (任务, 认领文件路径)；没有可认领的任务时返回 None。"""
+    dirs = job_dirs(shared)
+    try:
+        names = sorted(n for n in os.listdir(dirs["pending"]) if n.endswith(".json"))
+    except FileNotFoundError:
+        return None
+    for name in names:
+        job_id = name[:-len(".json")]
+        claimed = os.path.join(dirs["claimed"], f"{job_id}@{worker_id}.json")
+        try:
+            os.rename(os.path.join(dirs["pending"], name), claimed)
+        except OSError:
+            continue  # 已被其他 worker 认领
+        os.utime(claimed)
+        with open(claimed, "r", encoding="utf-8") as f:
+            return json.load(f), claimed
+    return None
+
+
+class JobHeartbeat:
+    """处理任务期间定时刷新认领文件的修改时间；文件被重新入队后自动停止。"""
+
+    def __init__(self, claimed_path: str, interval: float = JOB_HEARTBEAT_SECONDS):
+        self.claimed_path = claimed_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="job-heartbeat", daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                os.utime(self.claimed_path)
+            except OSError:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def discard_claimed(claimed_path: str):
+    try:
+        os.remove(claimed_path)
+    except OSError:
+        pass  # 已被判定超时并重新入队，由其他 worker 重复处理，结果一致
+
+
+def run_worker(shared: str, worker_id: str = None, exit_when_idle: bool = False,
+               memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024,
+               poll_seconds: float = JOB_POLL_SECONDS, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+    """无界面 worker 主循环，返回本 worker 处理的任务数。"""
+    import socket
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    dirs = job_dirs(shared)
+    os.makedirs(dirs["logs"], exist_ok=True)
+    log_path = os.path.join(dirs["logs"], f"{worker_id}.log")
+
+    def log(message):
+        line = f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}"
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        if sys.stdout is not None:  # 打包为窗口程序时没有控制台
+            print(line, flush=True)
+
+    batch = read_batch(shared)
+    governor = MemoryGovernor(memory_budget_bytes)
+    log(f"worker {worker_id} 已启动，共享文件夹：{shared}")
+
+    handled = 0
+    while True:
+        requeue_stale_jobs(shared, stale_seconds)
+        claimed = claim_job(shared, worker_id)
+        if claimed is None:
+            status = batch_status(shared)
+            if exit_when_idle and status["pending"] == 0 and status["claimed"] == 0:
+                log(f"没有待处理任务，worker 退出（本次处理 {handled} 个）")
+                return handled
+            time.sleep(poll_seconds)
+            continue
+
+        job, claimed_path = claimed
+        job_id = job["job_id"]
+        job_batch = job.get("batch_id")
+        if job_batch != batch.get("batch_id"):
+            previous = batch.get("batch_id")
+            batch = read_batch(shared)  # 发布了新批次，重新读取规则
+            if batch.get("batch_id") != previous:
+                log(f"已加载批次 {batch.get('batch_id')} 的规则")
+        if job_batch != batch.get("batch_id"):
+            log(f"任务 {job_id} 属于已被替换的批次，丢弃")
+            discard_claimed(claimed_path)
+            continue
+
+        rule = batch["rule"]
+        input_path = os.path.join(shared, *job["input"].split("/"))
+        out_path = os.path.join(dirs["outputs"], job_batch or "", job["output"])
+        tmp_out = f"{out_path}.{worker_id}.tmp.xlsx"
+        started = time.time()
+        result = dict(job, worker=worker_id)
+        try:
+            with JobHeartbeat(claimed_path):
+                plan = governor.plan_file(input_path, rule)
+                rows = convert_file_job(input_path, tmp_out, rule, batch["general_output_map"],
+                                        batch["value_output_map"], plan["strategy"], plan["chunk_rows"],
+                                        metric_name=job["metric_name"])["rows"]
+            result.update(status="done", rows=rows, seconds=round(time.time() - started, 3))
+        except Exception as e:
+            result.update(status="failed", error=str(e), seconds=round(time.time() - started, 3))
+
+        # 处理期间发布了新批次时，旧批次的结果不再写出
+        if current_batch_id(shared) != job_batch:
+            log(f"任务 {job_id} 所属批次已被替换，丢弃结果")
+            if os.path.exists(tmp_out):
+                os.remove(tmp_out)
+            discard_claimed(claimed_path)
+            continue
+        if result["status"] == "done":
+            try:
+                os.replace(tmp_out, out_path)
+            except OSError as e:
+                result.update(status="failed", error=str(e))
+        if result["status"] == "done":
+            write_json_atomic(os.path.join(dirs["done"], f"{job_id}.json"), result, worker_id)
+            log(f"任务 {job_id} 完成：{job['output']}（{rows} 行）")
+        else:
+            if os.path.exists(tmp_out):
+                os.remove(tmp_out)
+            write_json_atomic(os.path.join(dirs["failed"], f"{job_id}.json"), result, worker_id)
+            log(f"任务 {job_id} 失败：{result['error']}")
+        discard_claimed(claimed_path)
+        handled += 1
+
+
+# --- 本地转换服务：其他内部脚本通过 HTTP 上传工作簿和规则 JSON，获得转换结果 ---
+SERVICE_HOST = "127.0.0.1"
+SERVICE_DEFAULT_PORT = 8765
+SERVICE_QUEUE_PER_WORKER = 4
+SERVICE_REQUEST_TIMEOUT = 600
+SERVICE_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+SERVICE_OUTPUT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+
+
+def warm_service_worker():
+    """服务进程池的初始化函数：提前导入 pandas 与 Excel 引擎，请求到来时无需再加载。"""
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    try:
+        import xlrd  # noqa: F401
+    except ImportError:
+        pass
+
+
+SERVICE_RULE_REQUIRED = ("index_column", "selected_columns")
+EXPAND_MODES = ("index_then_value", "value_then_index")
+
+
+def default_general_output_map(rule: dict) -> dict:
+    """通用输出字段的默认配置，与“配置输出字段”对话框首次打开时相同。"""
+    fields = {}
+    if rule.get("enable_serial_number"):
+        fields["序号"] = "序号"
+    fields["索引列名"] = rule.get("index_alias") or rule.get("index_column")
+    fields["转换后列名"] = rule.get("value_column_alias")
+    return fields
+
+
+def prepare_service_rule(rule) -> dict:
+    """校验上传的规则并按界面的默认值补全可选字段；规则无效时抛出 ValueError，说明是哪个字段。"""
+    if not isinstance(rule, dict):
+        raise ValueError("规则 JSON 必须是对象")
+    missing = [key for key in SERVICE_RULE_REQUIRED if not rule.get(key)]
+    if missing:
+        raise ValueError(f"规则缺少必填字段：{'、'.join(missing)}")
+    if not isinstance(rule["index_column"], str):
+        raise ValueError("规则字段 index_column 必须是列名字符串")
+    if not isinstance(rule["selected_columns"], list) or not all(isinstance(c, str) for c in rule["selected_columns"]):
+        raise ValueError("规则字段 selected_columns 必须是列名字符串的列表")
+
+    rule = dict(rule)
+    rule["index_alias"] = rule.get("index_alias") or rule["index_column"]
+    rule["value_column_alias"] = rule.get("value_column_alias") or "日期"
+    rule.setdefault("expand_mode", "index_then_value")
+    rule.setdefault("enable_serial_number", True)
+    rule.setdefault("enable_trim_and_prefix", True)
+    rule.setdefault("data_prefix", "#")
+    choices = {
+        "expand_mode": EXPAND_MODES,
+        "duplicate_agg": [mode for mode, _ in DUPLICATE_AGG_MODES],
+        "value_column_type": [kind for kind, _ in VALUE_COLUMN_TYPES],
+    }
+    for key, allowed in choices.items():
+        if key in rule and rule[key] not in allowed:
+            raise ValueError(f"规则字段 {key} 的值 {rule[key]!r} 无效，可选：{'、'.join(allowed)}")
+    if not rule.get("general_output_map"):
+        rule["general_output_map"] = default_general_output_map(rule)
+    return rule
+
+
+def convert_upload(data: bytes, filename: str, rule: dict, output_format: str, submitted_at: float) -> dict:
+    """在服务进程池中执行：解析上传的工作簿、转换并编码为请求的格式。"""
+    started = time.time()
+    df = pd.read_excel(io.BytesIO(data), engine=excel_engine_for(filename))
+    parsed = time.time()
+    metric_name = os.path.splitext(os.path.basename(filename))[0]
+    out_df = convert_dataframe(df, rule, metric_name, rule.get("general_output_map"))
+    converted = time.time()
+
+    buf = io.BytesIO()
+    if output_format == "csv":
+        out_df.to_csv(buf, index=False, encoding="utf-8-sig")
+    elif output_format == "json":
+        buf.write(out_df.to_json(orient="records", force_ascii=False, date_format="iso").encode("utf-8"))
+    else:
+        write_output_excel(out_df, buf, rule)
+    finished = time.time()
+    return {
+        "body": buf.getvalue(),
+        "rows": len(out_df),
+        "pid": os.getpid(),
+        "timings": {
+            "queue": started - submitted_at,
+            "parse": parsed - started,
+            "convert": converted - parsed,
+            "encode": finished - converted,
+        },
+    }
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    """解析 multipart/form-data，返回 {字段名: (文件名, 内容)}。"""
+    import email.policy
+    from email.parser import BytesParser
+    head = f"Content-Type: {content_type}\r\nMIME-Version: 1.0\r\n\r\n".encode("utf-8")
+    message = BytesParser(policy=email.policy.HTTP).parsebytes(head + body)
+    fields = {}
+    if not message.is_multipart():
+        return fields
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+class ConversionService:
+    """由常驻进程池执行转换；排队中加执行中的请求数有上限，超出时立即返回 503。"""
+
+    def __init__(self, workers: int = None, queue_limit: int = None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.queue_limit = queue_limit or self.workers * SERVICE_QUEUE_PER_WORKER
+        self.slots = threading.BoundedSemaphore(self.queue_limit)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.pool_restarts = 0
+        self.last_pool_error = None
+        self.pool = self.new_pool()
+        # 预先启动全部工作进程并完成导入
+        for fut in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            fut.result()
+
+    def new_pool(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        ctx = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=warm_service_worker)
+
+    def pool_broken(self) -> bool:
+        # 工作进程异常退出后 ProcessPoolExecutor 不再接受任务，且只以内部属性标记
+        return bool(getattr(self.pool, "_broken", False))
+
+    def replace_pool(self, broken_pool, error):
+        """broken_pool 中有工作进程异常退出（如因内存不足被结束）时换用新的进程池；多个请求同时发现时只替换一次。"""
+        with self.lock:
+            if self.pool is not broken_pool:
+                return
+            self.pool = self.new_pool()
+            self.pool_restarts += 1
+            self.last_pool_error = str(error)
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        # 不等待：新进程在后台启动，之后的请求无需再承担启动耗时
+        for _ in range(self.workers):
+            self.pool.submit(os.getpid)
+
+    def submit(self, data, filename, rule, output_format):
+        """返回 Future；没有空闲名额时返回 None。进程池损坏且换用新池后仍无法提交时抛出 BrokenProcessPool。"""
+        from concurrent.futures.process import BrokenProcessPool
+        if not self.slots.acquire(blocking=False):
+            return None
+        with self.lock:
+            self.in_flight += 1
+
+        def release(_=None):
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+        pool = self.pool
+        try:
+            try:
+                future = pool.submit(convert_upload, data, filename, rule, output_format, time.time())
+            except BrokenProcessPool as e:
+                self.replace_pool(pool, e)
+                pool = self.pool
+                future = pool.submit(convert_upload, data, filename, rule, output_format, time.time())
+        except BaseException:
+            release()
+            raise
+
+        def on_done(fut):
+            release()
+            error = None if fut.cancelled() else fut.exception()
+            if isinstance(error, BrokenProcessPool):
+                self.replace_pool(pool, error)
+
+        future.add_done_callback(on_done)
+        return future
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def conversion_request_handler(service: ConversionService):
+    """返回绑定 service 的请求处理类。http.server 等只在启动服务时导入，不增加界面的启动耗时。"""
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    from concurrent.futures.process import BrokenProcessPool
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, quote, urlparse
+
+    class ConversionRequestHandler(BaseHTTPRequestHandler):
+        """POST /convert?format=xlsx|csv|json，表单字段 file（工作簿）与 rule（规则 JSON）；GET /health 查看状态。"""
+
+        service: ConversionService = None
+        server_version = "KuanbiaoConvert/1.0"
+
+        def log_message(self, format, *args):
+            if sys.stderr is not None:
+                super().log_message(format, *args)
+
+        def send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path != "/health":
+                self.send_json(404, {"error": "not found"})
+                return
+            service = self.service
+            broken = service.pool_broken()
+            self.send_json(503 if broken else 200,
+                           {"status": "broken" if broken else "ok", "workers": service.workers,
+                            "in_flight": service.in_flight, "queue_limit": service.queue_limit,
+                            "pool_restarts": service.pool_restarts, "last_pool_error": service.last_pool_error})
+
+        def do_POST(self):
+            received = time.time()
+            url = urlparse(self.path)
+            if url.path != "/convert":
+                self.send_json(404, {"error": "not found"})
+                return
+            output_format = parse_qs(url.query).get("format", ["xlsx"])[0].lower()
+            if output_format not in SERVICE_OUTPUT_TYPES:
+                self.send_json(400, {"error": f"不支持的输出格式：{output_format}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0 or length > SERVICE_MAX_UPLOAD_BYTES:
+                self.send_json(413 if length else 411, {"error": "请求体为空或超过大小限制"})
+                return
+
+            fields = parse_multipart(self.headers.get("Content-Type", ""), self.rfile.read(length))
+            if "file" not in fields or "rule" not in fields:
+                self.send_json(400, {"error": "需要 multipart/form-data 字段 file 与 rule"})
+                return
+            filename, data = fields["file"]
+            filename = filename or "upload.xlsx"
+            if not filename.lower().endswith((".xls", ".xlsx")):
+                self.send_json(400, {"error": "只支持 .xlsx 或 .xls 文件"})
+                return
+            try:
+                rule = json.loads(fields["rule"][1].decode("utf-8"))
+            except ValueError as e:
+                self.send_json(400, {"error": f"规则 JSON 无效：{e}"})
+                return
+            try:
+                rule = prepare_service_rule(rule)
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+
+            try:
+                future = self.service.submit(data, filename, rule, output_format)
+            except BrokenProcessPool:
+                self.send_json(503, {"error": "工作进程不可用，请稍后重试"}, {"Retry-After": "1"})
+                return
+            if future is None:
+                self.send_json(503, {"error": "服务繁忙，请稍后重试"}, {"Retry-After": "1"})
+                return
+            try:
+                result = future.result(timeout=SERVICE_REQUEST_TIMEOUT)
+            except FutureTimeoutError:
+                self.send_json(504, {"error": "转换超时"})
+                return
+            except BrokenProcessPool:
+                # 处理该请求的工作进程异常退出，服务已换用新的进程池，客户端可以重试
+                self.send_json(503, {"error": "工作进程异常退出，请重试"}, {"Retry-After": "1"})
+                return
+            except Exception as e:
+                self.send_json(422, {"error": f"转换失败：{e}"})
+                return
+
+            timings = dict(result["timings"], total=time.time() - received)
+            out_name = os.path.splitext(build_output_name(rule.get("output_name_template"), filename))[0]
+            self.send_response(200)
+            self.send_header("Content-Type", SERVICE_OUTPUT_TYPES[output_format])
+            self.send_header("Content-Length", str(len(result["body"])))
+            self.send_header("Content-Disposition",
+                             f"attachment; filename*=UTF-8''{quote(out_name + '.' + output_format)}")
+            self.send_header("Server-Timing", ", ".join(f"{k};dur={v * 1000:.1f}" for k, v in timings.items()))
+            self.send_header("X-Total-Time-Ms", f"{timings['total'] * 1000:.1f}")
+            self.send_header("X-Output-Rows", str(result["rows"]))
+            self.send_header("X-Worker-Pid", str(result["pid"]))
+            self.end_headers()
+            self.wfile.write(result["body"])
+
+    ConversionRequestHandler.service = service
+    return ConversionRequestHandler
+
+
+def run_service(port: int = SERVICE_DEFAULT_PORT, workers: int = None):
+    from http.server import ThreadingHTTPServer
+    service = ConversionService(workers)
+    httpd = ThreadingHTTPServer((SERVICE_HOST, port), conversion_request_handler(service))
+    httpd.daemon_threads = True
+
+    def handle_terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    # 收到终止信号时同样走正常退出流程，避免遗留工作进程
+    signal.signal(signal.SIGTERM, handle_terminate)
+    if sys.stdout is not None:
+        print(f"转换服务已启动：http://{SERVICE_HOST}:{httpd.server_port}（{service.workers} 个工作进程）", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+WATCH_POLL_MS = 1000
+WATCH_DEBOUNCE_SECONDS = 3.0
+WATCH_QUEUE_SIZE = 16
+
+
+class FolderWatchService(QObject):
+    """监控输入文件夹，新增或修改的 Excel 文件在写入稳定后自动转换到导出文件夹。
+
+    目录变化由 QFileSystemWatcher 触发即时扫描，同时以定时轮询兜底（网络共享目录上
+    文件系统通知不可靠）。文件大小和修改时间在 debounce 秒内保持不变才视为写入完成，
+    随后放入有界队列，由后台线程逐个转换，队列满时留到下一轮扫描再入队。
+    """
+
+    log_message = pyqtSignal(str, bool)
+
+    def __init__(self, watch_folder, export_folder, rule, general_output_map=None, value_output_map=None,
+                 sheet_cache=None, debounce_seconds=WATCH_DEBOUNCE_SECONDS, parent=None):
+        super().__init__(parent)
+        self.watch_folder = watch_folder
+        self.export_folder = export_folder
+        self.rule = rule
+        self.general_output_map = dict(general_output_map or {})
+        self.value_output_map = dict(value_output_map or {})
+        self.sheet_cache = sheet_cache
+        self.debounce_seconds = debounce_seconds
+
+        self.pending = {}    # path -> (签名, 签名首次出现的时间)
+        self.processed = {}  # path -> 已入队处理的签名
+        self.queue = queue.Queue(maxsize=WATCH_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.worker = None
+
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.scan)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(WATCH_POLL_MS)
+        self.poll_timer.timeout.connect(self.scan)
+
+    @staticmethod
+    def file_signature(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def list_excel_files(self):
+        files = []
+        for name in os.listdir(self.watch_folder):
+            # 跳过 Office 打开文件时生成的 ~$ 锁文件
+            if name.startswith("~$") or not name.lower().endswith((".xls", ".xlsx")):
+                continue
+            full = os.path.join(self.watch_folder, name)
+            if os.path.isfile(full):
+                files.append(full)
+        return files
+
+    def start(self):
+        # 启动时已存在的文件作为基线，只处理之后新增或修改的文件
+        for path in self.list_excel_files():
+            try:
+                self.processed[path] = self.file_signature(path)
+            except OSError:
+                pass
+        if not self.fs_watcher.addPath(self.watch_folder):
+            self.log_message.emit("文件系统通知不可用，改为轮询监控。", False)
+        self.stop_event.clear()
+        self.worker = threading.Thread(target=self.worker_loop, name="watch-worker", daemon=True)
+        self.worker.start()
+        self.poll_timer.start()
+        self.log_message.emit(
+            f"开始监控文件夹：{self.watch_folder}（已有 {len(self.processed)} 个文件作为基线，不重复转换）", False)
+
+    def stop(self):
+        """停止监控并等待后台线程退出；调用方之后才能安全地 deleteLater。"""
+        self.poll_timer.stop()
+        if self.watch_folder in self.fs_watcher.directories():
+            self.fs_watcher.removePath(self.watch_folder)
+        self.stop_event.set()
+        # 丢弃尚未开始的文件，只等待正在转换的那一个完成
+        discarded = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            discarded += 1
+        if self.worker is not None and self.worker.is_alive():
+            self.log_message.emit("正在等待当前文件转换完成…", False)
+            self.worker.join()
+        self.worker = None
+        if discarded:
+            self.log_message.emit(f"已停止监控文件夹，{discarded} 个排队中的文件未转换。", False)
+        else:
+            self.log_message.emit("已停止监控文件夹。", False)
+
+    def is_write_complete(self, path):
+        try:
+            with open(path, "rb"):
+                return True
+        except OSError:
+            # Windows 下正在复制的文件无法打开
+            return False
+
+    def scan(self, *_):
+        try:
+            files = self.list_excel_files()
+        except OSError as e:
+            self.log_message.emit(f"扫描监控文件夹失败：{e}", True)
+            return
+        now = time.monotonic()
+        present = set(files)
+        for path in list(self.pending):
+            if path not in present:
+                del self.pending[path]
+        for path in files:
+            try:
+                sig = self.file_signature(path)
+            except OSError:
+                continue
+            if self.processed.get(path) == sig:
+                continue
+            prev = self.pending.get(path)
+            if prev is None or prev[0] != sig:
+                self.pending[path] = (sig, now)
+                continue
+            if now - prev[1] < self.debounce_seconds or not self.is_write_complete(path):
+                continue
+            try:
+                self.queue.put_nowait(path)
+            except queue.Full:
+                break
+            self.processed[path] = sig
+            del self.pending[path]
+
+    def worker_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                path = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.convert_file(path)
+            self.queue.task_done()
+
+    def convert_file(self, path):
+        name = os.path.basename(path)
+        try:
+            df, _ = read_excel_cached(
+                path, self.sheet_cache,
+                on_skip=lambda reason: self.log_message.emit(f"[监控] 未缓存：{name}，原因：{reason}", True))
+            metric_name = os.path.splitext(name)[0]
+            out_df = convert_dataframe(df, self.rule, metric_name, self.general_output_map, self.value_output_map)
+            out_name = build_output_name(self.rule.get("output_name_template"), path)
+            write_output_excel(out_df, os.path.join(self.export_folder, out_name), self.rule)
+            self.log_message.emit(f"[监控] 成功导出：{out_name} （{len(out_df)} 行）", False)
+        except Exception as e:
+            self.log_message.emit(f"[监控] 处理文件出错：{name} 错误：{e}", True)
+
+
+# --- 可选列列表：模型/视图方式，只渲染可见行，勾选状态保存在集合中 ---
+COLUMN_FILTER_MODES = [
+    ("contains", "包含"),
+    ("wildcard", "通配符"),
+    ("regex", "正则"),
+    ("range", "范围（起始列..结束列）"),
+]
+
+
+class ColumnListModel(QAbstractListModel):
+    """可勾选的列名列表。勾选状态存放在 set 中，批量勾选只发出一次 dataChanged。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = []
+        self.positions = {}
+        self.checked = set()
+
+    def set_columns(self, columns, checked=None):
+        self.beginResetModel()
+        self.columns = list(columns)
+        self.positions = {c: i for i, c in enumerate(self.columns)}
+        self.checked = set(checked or ()) & set(self.positions)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        col = self.columns[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return col
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if col in self.checked else Qt.CheckState.Unchecked
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        col = self.columns[index.row()]
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.checked.add(col)
+        else:
+            self.checked.discard(col)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
+    def toggle(self, row):
+        col = self.columns[row]
+        if col in self.checked:
+            self.checked.discard(col)
+        else:
+            self.checked.add(col)
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx, [Qt.ItemDataRole.CheckStateRole])
+
+    def set_checked(self, columns, checked: bool):
+        if checked:
+            self.checked.update(c for c in columns if c in self.positions)
+        else:
+            self.checked.difference_update(columns)
+        if self.columns:
+            self.dataChanged.emit(self.index(0), self.index(len(self.columns) - 1),
+                                  [Qt.ItemDataRole.CheckStateRole])
+
+    def selected_columns(self):
+        # 按表头顺序返回，复杂度只与已选列数有关
+        return sorted(self.checked, key=self.positions.__getitem__)
+
+
+def match_columns(columns, pattern: str, mode: str) -> set:
+    """返回匹配筛选条件的列名集合；正则无效时抛出 re.error。"""
+    if mode == "range":
+        if ".." not in pattern:
+            return set()
+        start, end = (p.strip() for p in pattern.split("..", 1))
+        positions = {c: i for i, c in enumerate(columns)}
+        if start not in positions or end not in positions:
+            return set()
+        lo, hi = sorted((positions[start], positions[end]))
+        return set(columns[lo:hi + 1])
+    if mode == "wildcard":
+        matcher = re.compile(fnmatch.translate(pattern)).match
+    elif mode == "regex":
+        matcher = re.compile(pattern).search
+    else:
+        return {c for c in columns if pattern in c}
+    return {c for c in columns if matcher(c)}
+
+
+class ColumnFilterProxy(QSortFilterProxyModel):
+    """按 match_columns 的结果过滤显示的列。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.accepted = None  # None 表示不过滤
+
+    def set_accepted(self, accepted):
+        self.accepted = accepted
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.accepted is None:
+            return True
+        return self.sourceModel().columns[source_row] in self.accepted
+
+
 # --- 新的字段配置对话框，支持多可配置字段列配置 ---
 class OutputConfigDialog(QDialog):
     def __init__(self, initial_general_map, initial_value_map, parent=None):
@@ -153,6 +1840,14 @@ class ExcelCleanerGeneral(QMainWindow):
         self.general_output_map = {}
         self.value_output_map = {}
 
+        self.sheet_cache = None
+        self.watch_service = None
+        self.shared_batch_folder = None
+        self.shared_batch_timer = QTimer(self)
+        self.shared_batch_timer.setInterval(int(JOB_POLL_SECONDS * 1000))
+        self.shared_batch_timer.timeout.connect(self.poll_shared_batch)
+        self.shared_batch_last_status = None
+
         self.rule = {
             "selected_columns": [],
             "index_column": None,
@@ -163,6 +1858,9 @@ class ExcelCleanerGeneral(QMainWindow):
             "enable_serial_number": True,
             "enable_trim_and_prefix": True,
             "data_prefix": "#",
+            "duplicate_agg": "none",
+            "value_column_type": "text",
+            "value_column_format": "",
             "general_output_map": {}  # 新增的规则字段
         }
 
@@ -202,11 +1900,29 @@ class ExcelCleanerGeneral(QMainWindow):
         # 列选择区
         col_box_layout = QVBoxLayout()
         col_box_layout.addWidget(QLabel("可选列（勾选后参与展开，默认全选；双击切换勾选）："))
-        self.list_columns = QListWidget()
-        self.list_columns.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
-        self.list_columns.itemDoubleClicked.connect(self.toggle_column_selection)
+        self.column_model = ColumnListModel(self)
+        self.column_proxy = ColumnFilterProxy(self)
+        self.column_proxy.setSourceModel(self.column_model)
+        self.list_columns = QListView()
+        self.list_columns.setModel(self.column_proxy)
+        self.list_columns.setUniformItemSizes(True)
+        self.list_columns.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+        self.list_columns.doubleClicked.connect(self.toggle_column_selection)
         col_box_layout.addWidget(self.list_columns)
 
+        # 列筛选：支持包含文本、通配符（如 2025-07-*）、正则和“起始列..结束列”范围
+        filter_layout = QHBoxLayout()
+        self.edit_column_filter = QLineEdit()
+        self.edit_column_filter.setPlaceholderText("筛选列，例如 2025-07-*")
+        self.edit_column_filter.textChanged.connect(self.apply_column_filter)
+        filter_layout.addWidget(self.edit_column_filter)
+        self.combo_filter_mode = QComboBox()
+        for mode, text in COLUMN_FILTER_MODES:
+            self.combo_filter_mode.addItem(text, mode)
+        self.combo_filter_mode.currentIndexChanged.connect(self.apply_column_filter)
+        filter_layout.addWidget(self.combo_filter_mode)
+        col_box_layout.addLayout(filter_layout)
+
         select_btns_layout = QHBoxLayout()
         self.btn_select_all = QPushButton("全选")
         self.btn_select_all.clicked.connect(self.select_all_columns)
@@ -216,6 +1932,14 @@ class ExcelCleanerGeneral(QMainWindow):
         self.btn_deselect_all.clicked.connect(self.deselect_all_columns)
         select_btns_layout.addWidget(self.btn_deselect_all)
 
+        self.btn_check_filtered = QPushButton("勾选筛选结果")
+        self.btn_check_filtered.clicked.connect(lambda: self.set_filtered_columns_checked(True))
+        select_btns_layout.addWidget(self.btn_check_filtered)
+
+        self.btn_uncheck_filtered = QPushButton("取消筛选结果")
+        self.btn_uncheck_filtered.clicked.connect(lambda: self.set_filtered_columns_checked(False))
+        select_btns_layout.addWidget(self.btn_uncheck_filtered)
+
         col_box_layout.addLayout(select_btns_layout)
         row2.addLayout(col_box_layout, 2)
 
@@ -234,11 +1958,31 @@ class ExcelCleanerGeneral(QMainWindow):
         self.edit_value_alias.setText("日期")
         ctrl_layout.addWidget(self.edit_value_alias)
 
+        # 转换后列类型：把列名解析为真正的日期/数字
+        value_type_layout = QHBoxLayout()
+        value_type_layout.addWidget(QLabel("类型："))
+        self.combo_value_type = QComboBox()
+        for value_type, text in VALUE_COLUMN_TYPES:
+            self.combo_value_type.addItem(text, value_type)
+        value_type_layout.addWidget(self.combo_value_type)
+        self.edit_value_format = QLineEdit()
+        value_type_layout.addWidget(self.edit_value_format)
+        ctrl_layout.addLayout(value_type_layout)
+        self.combo_value_type.currentIndexChanged.connect(self.update_value_format_hint)
+        self.update_value_format_hint()
+
         ctrl_layout.addWidget(QLabel("展开顺序："))
         self.combo_expand_mode = QComboBox()
         self.combo_expand_mode.addItems(["按索引先展开（每个索引展开所有 value）", "按列先展开（每列展开所有索引）"])
         ctrl_layout.addWidget(self.combo_expand_mode)
 
+        # 重复索引聚合方式（同一 ID 出现在多行时）
+        ctrl_layout.addWidget(QLabel("重复索引处理："))
+        self.combo_duplicate_agg = QComboBox()
+        for mode, text in DUPLICATE_AGG_MODES:
+            self.combo_duplicate_agg.addItem(text, mode)
+        ctrl_layout.addWidget(self.combo_duplicate_agg)
+
         # 增加序号列功能（默认开启）
         self.cb_add_index_column = QCheckBox("增加序号列")
         self.cb_add_index_column.setChecked(self.rule["enable_serial_number"])
@@ -258,6 +2002,31 @@ class ExcelCleanerGeneral(QMainWindow):
         clean_layout.addWidget(self.edit_data_prefix)
         ctrl_layout.addLayout(clean_layout)
 
+        # 解析缓存：重复处理同一批文件时跳过 Excel 解析
+        cache_layout = QHBoxLayout()
+        self.cb_enable_cache = QCheckBox("启用解析缓存")
+        self.cb_enable_cache.stateChanged.connect(self.update_sheet_cache)
+        cache_layout.addWidget(self.cb_enable_cache)
+        cache_layout.addWidget(QLabel("上限(MB)："))
+        self.spin_cache_limit = QSpinBox()
+        self.spin_cache_limit.setRange(64, 1024 * 1024)
+        self.spin_cache_limit.setValue(DEFAULT_CACHE_LIMIT_MB)
+        self.spin_cache_limit.valueChanged.connect(self.update_sheet_cache)
+        cache_layout.addWidget(self.spin_cache_limit)
+        self.btn_clear_cache = QPushButton("清空缓存")
+        self.btn_clear_cache.clicked.connect(self.clear_sheet_cache)
+        cache_layout.addWidget(self.btn_clear_cache)
+        ctrl_layout.addLayout(cache_layout)
+
+        # 内存预算：批量转换时据此选择整表/分块处理及并发数
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("内存预算(MB)："))
+        self.spin_memory_budget = QSpinBox()
+        self.spin_memory_budget.setRange(256, 1024 * 1024)
+        self.spin_memory_budget.setValue(DEFAULT_MEMORY_BUDGET_MB)
+        budget_layout.addWidget(self.spin_memory_budget)
+        ctrl_layout.addLayout(budget_layout)
+
         self.btn_configure_output = QPushButton("【3】配置输出字段和顺序")
         self.btn_configure_output.clicked.connect(self.configure_output_fields)
         ctrl_layout.addWidget(self.btn_configure_output)
@@ -291,8 +2060,12 @@ class ExcelCleanerGeneral(QMainWindow):
             "你可以将当前所有配置（包括列选择、别名和通用字段顺序）保存为规则文件，以便下次直接加载使用。\n\n"
             "**6. 数据清理：**\n"
             "勾选“启用数据清理和添加前缀”可自动去除单元格前后空格。你也可以自定义前缀，例如 #。\n\n"
-            "**7. 批量导出：**\n"
-            "程序会根据你的文件名模板，依次处理所有导入文件，并导出到指定文件夹。"
+            "**7. 重复索引：**\n"
+            "同一 ID 出现在多行时，可选择求和、平均值、取首/末条、计数或拼接文本，将其合并为一行再展开。\n\n"
+            "**8. 批量导出：**\n"
+            "程序会根据你的文件名模板，依次处理所有导入文件，并导出到指定文件夹。\n\n"
+            "**9. 监控文件夹：**\n"
+            "配置确认后点击“开始监控文件夹”，之后放入该文件夹的新文件会在写入完成后自动按当前规则转换导出。"
         )
         tips_layout.addWidget(self.tips_text)
         row2.addLayout(tips_layout, 1)
@@ -313,6 +2086,18 @@ class ExcelCleanerGeneral(QMainWindow):
         self.btn_export_single.clicked.connect(self.export_current_single)
         btn_row.addWidget(self.btn_export_single)
 
+        self.btn_export_sqlite = QPushButton("导出到 SQLite 数据库")
+        self.btn_export_sqlite.clicked.connect(self.export_all_to_sqlite)
+        btn_row.addWidget(self.btn_export_sqlite)
+
+        self.btn_submit_shared = QPushButton("发布到共享文件夹（多机处理）")
+        self.btn_submit_shared.clicked.connect(self.submit_shared_batch)
+        btn_row.addWidget(self.btn_submit_shared)
+
+        self.btn_watch_folder = QPushButton("开始监控文件夹（自动转换）")
+        self.btn_watch_folder.clicked.connect(self.toggle_watch_folder)
+        btn_row.addWidget(self.btn_watch_folder)
+
         self.btn_clear = QPushButton("初始化")
         self.btn_clear.clicked.connect(self.initialize_app)
         btn_row.addWidget(self.btn_clear)
@@ -323,6 +2108,14 @@ class ExcelCleanerGeneral(QMainWindow):
 
         main_layout.addLayout(btn_row)
 
+        # 批量处理期间禁用的控件：会再次启动任务或修改文件列表、规则与输出配置
+        self.busy_widgets = [
+            self.btn_import, self.btn_select_export_folder, self.btn_edit_selected_output,
+            self.file_list_widget, self.btn_configure_output, self.btn_load_rule, self.btn_clear_cache,
+            self.btn_convert, self.btn_export_single, self.btn_export_sqlite, self.btn_submit_shared,
+            self.btn_watch_folder, self.btn_clear,
+        ]
+
         main_layout.addWidget(QLabel("运行日志："))
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
@@ -345,6 +2138,12 @@ class ExcelCleanerGeneral(QMainWindow):
         self.log_text.append(line)
         self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
 
+    def set_busy(self, busy: bool):
+        # 处理过程中会调用 processEvents 刷新界面，此时禁用操作按钮和拖放，避免重复启动或中途修改状态
+        for widget in self.busy_widgets:
+            widget.setEnabled(not busy)
+        self.setAcceptDrops(not busy)
+
     def update_rule(self):
         self.rule["enable_trim_and_prefix"] = self.cb_trim_and_prefix.isChecked()
         self.rule["data_prefix"] = self.edit_data_prefix.text()
@@ -352,12 +2151,59 @@ class ExcelCleanerGeneral(QMainWindow):
         self.log("数据清理设置已更新到当前规则。")
         self.config_confirmed = False
 
+    def update_sheet_cache(self):
+        if not self.cb_enable_cache.isChecked():
+            if self.sheet_cache is not None:
+                self.log("解析缓存已关闭。")
+            self.sheet_cache = None
+            return
+        if not SheetCache.available():
+            self.log("未安装 pyarrow，无法启用解析缓存。", error=True)
+            self.cb_enable_cache.setChecked(False)
+            return
+        max_bytes = self.spin_cache_limit.value() * 1024 * 1024
+        if self.sheet_cache is None:
+            try:
+                self.sheet_cache = SheetCache(DEFAULT_CACHE_DIR, max_bytes)
+            except OSError as e:
+                self.log(f"创建缓存目录失败：{e}", error=True)
+                self.cb_enable_cache.setChecked(False)
+                return
+            self.log(f"解析缓存已启用：{DEFAULT_CACHE_DIR}")
+        else:
+            self.sheet_cache.max_bytes = max_bytes
+            self.sheet_cache.evict()
+
+    def clear_sheet_cache(self):
+        if not os.path.isdir(DEFAULT_CACHE_DIR):
+            return
+        try:
+            (self.sheet_cache or SheetCache(DEFAULT_CACHE_DIR)).clear()
+            self.log("解析缓存已清空。")
+        except OSError as e:
+            self.log(f"清空缓存失败：{e}", error=True)
+
+    def read_input_excel(self, path):
+        def on_skip(reason):
+            self.log(f"未缓存：{os.path.basename(path)}，原因：{reason}", error=True)
+
+        df, hit = read_excel_cached(path, self.sheet_cache, on_skip=on_skip)
+        if hit:
+            self.log(f"命中解析缓存：{os.path.basename(path)}")
+        return df
+
     def initialize_app(self):
         confirm = QMessageBox.question(self, "确认初始化",
                                        "确定要清空所有记录、规则和日志，回到初始状态吗？此操作不可撤销。",
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirm != QMessageBox.StandardButton.Yes:
             return
+        if self.watch_service is not None:
+            self.toggle_watch_folder()
+        # 停止跟踪已发布的分布式任务；共享文件夹中的任务不受影响，worker 会继续处理
+        self.shared_batch_timer.stop()
+        self.shared_batch_folder = None
+        self.shared_batch_last_status = None
         self.input_files.clear()
         self.output_files.clear()
         self.df_cache = None
@@ -365,7 +2211,8 @@ class ExcelCleanerGeneral(QMainWindow):
         self.export_folder = None
         self.input_folder = None
         self.file_list_widget.clear()
-        self.list_columns.clear()
+        self.column_model.set_columns([])
+        self.edit_column_filter.clear()
         self.combo_index.clear()
         self.cb_trim_and_prefix.setChecked(True)
         self.edit_data_prefix.setText("#")
@@ -381,12 +2228,18 @@ class ExcelCleanerGeneral(QMainWindow):
             "enable_serial_number": True,
             "enable_trim_and_prefix": True,
             "data_prefix": "#",
+            "duplicate_agg": "none",
+            "value_column_type": "text",
+            "value_column_format": "",
             "general_output_map": {}
         }
         self.edit_export_name.setText(self.rule["output_name_template"])
         self.edit_index_alias.clear()
         self.edit_value_alias.setText("日期")
         self.cb_add_index_column.setChecked(self.rule["enable_serial_number"])
+        self.combo_duplicate_agg.setCurrentIndex(0)
+        self.combo_value_type.setCurrentIndex(0)
+        self.edit_value_format.clear()
 
         self.log_text.clear()
         self.log("程序已初始化，所有记录和设置均已清空。")
@@ -438,8 +2291,7 @@ class ExcelCleanerGeneral(QMainWindow):
 
         if len(self.input_files) == 1:
             try:
-                engine = 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
-                df = pd.read_excel(path, engine=engine)
+                df = self.read_input_excel(path)
                 self.df_cache = df
                 self.current_columns = [str(c).strip() for c in df.columns]
                 self.populate_column_ui(selected_cols=self.rule.get("selected_columns"))
@@ -471,7 +2323,7 @@ class ExcelCleanerGeneral(QMainWindow):
         if not self.input_files:
             self.df_cache = None
             self.current_columns = []
-            self.list_columns.clear()
+            self.column_model.set_columns([])
             self.combo_index.clear()
             self.input_folder = None
             self.general_output_map = {}
@@ -496,47 +2348,53 @@ class ExcelCleanerGeneral(QMainWindow):
             return
         QDesktopServices.openUrl(QUrl.fromLocalFile(self.export_folder))
 
-    def toggle_column_selection(self, item: QListWidgetItem):
-        if item.checkState() == Qt.CheckState.Checked:
-            item.setCheckState(Qt.CheckState.Unchecked)
-        else:
-            item.setCheckState(Qt.CheckState.Checked)
+    def toggle_column_selection(self, index: QModelIndex):
+        self.column_model.toggle(self.column_proxy.mapToSource(index).row())
         self.config_confirmed = False
 
     def populate_column_ui(self, selected_cols=None):
-        self.list_columns.clear()
         self.combo_index.clear()
         if not self.current_columns:
+            self.column_model.set_columns([])
             return
 
-        for col in self.current_columns:
-            it = QListWidgetItem(col)
-            it.setFlags(it.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-            if selected_cols is not None and col in selected_cols:
-                it.setCheckState(Qt.CheckState.Checked)
-            else:
-                it.setCheckState(Qt.CheckState.Unchecked)
-            self.list_columns.addItem(it)
-            self.combo_index.addItem(col)
+        self.column_model.set_columns(self.current_columns, selected_cols if selected_cols else self.current_columns)
+        self.apply_column_filter()
+        self.combo_index.addItems(self.current_columns)
 
         if not selected_cols:
-            self.select_all_columns()
+            self.log("已全选所有列")
 
         if self.current_columns:
             self.combo_index.setCurrentIndex(0)
         self.config_confirmed = False
 
+    def apply_column_filter(self, *_):
+        pattern = self.edit_column_filter.text().strip()
+        if not pattern:
+            self.column_proxy.set_accepted(None)
+            return
+        try:
+            accepted = match_columns(self.column_model.columns, pattern, self.combo_filter_mode.currentData())
+        except re.error:
+            accepted = set()
+        self.column_proxy.set_accepted(accepted)
+
+    def set_filtered_columns_checked(self, checked: bool):
+        accepted = self.column_proxy.accepted
+        if accepted is None:
+            accepted = self.column_model.columns
+        self.column_model.set_checked(accepted, checked)
+        self.log(f"已{'勾选' if checked else '取消勾选'} {len(accepted)} 个筛选结果列")
+        self.config_confirmed = False
+
     def select_all_columns(self):
-        for i in range(self.list_columns.count()):
-            item = self.list_columns.item(i)
-            item.setCheckState(Qt.CheckState.Checked)
+        self.column_model.set_checked(self.column_model.columns, True)
         self.log("已全选所有列")
         self.config_confirmed = False
 
     def deselect_all_columns(self):
-        for i in range(self.list_columns.count()):
-            item = self.list_columns.item(i)
-            item.setCheckState(Qt.CheckState.Unchecked)
+        self.column_model.set_checked(list(self.column_model.checked), False)
         self.log("已取消全选所有列")
         self.config_confirmed = False
 
@@ -559,12 +2417,13 @@ class ExcelCleanerGeneral(QMainWindow):
                 self.log(f"已修改导出名：{basename} -> {new_name}")
         self.config_confirmed = False
 
+    def update_value_format_hint(self):
+        value_type = self.combo_value_type.currentData() or "text"
+        self.edit_value_format.setPlaceholderText(VALUE_FORMAT_HINTS[value_type])
+        self.edit_value_format.setEnabled(value_type != "text")
+
     def build_rule_from_ui(self):
-        selected_columns = []
-        for i in range(self.list_columns.count()):
-            item = self.list_columns.item(i)
-            if item.checkState() == Qt.CheckState.Checked:
-                selected_columns.append(item.text())
+        selected_columns = self.column_model.selected_columns()
         index_col = self.combo_index.currentText() if self.combo_index.count() > 0 else None
 
         rule = {
@@ -577,6 +2436,9 @@ class ExcelCleanerGeneral(QMainWindow):
             "enable_serial_number": self.cb_add_index_column.isChecked(),
             "enable_trim_and_prefix": self.cb_trim_and_prefix.isChecked(),
             "data_prefix": self.edit_data_prefix.text(),
+            "duplicate_agg": self.combo_duplicate_agg.currentData() or "none",
+            "value_column_type": self.combo_value_type.currentData() or "text",
+            "value_column_format": self.edit_value_format.text().strip(),
             "general_output_map": self.general_output_map
         }
         return rule
@@ -593,10 +2455,7 @@ class ExcelCleanerGeneral(QMainWindow):
 
         initial_general_map = current_rule["general_output_map"].copy()
         if not initial_general_map:
-            if enable_serial:
-                initial_general_map["序号"] = "序号"
-            initial_general_map["索引列名"] = index_alias
-            initial_general_map["转换后列名"] = value_alias
+            initial_general_map = default_general_output_map(current_rule)
         else:
             if enable_serial and "序号" not in initial_general_map:
                 initial_general_map = {"序号": "序号", **initial_general_map}
@@ -650,6 +2509,11 @@ class ExcelCleanerGeneral(QMainWindow):
         self.cb_add_index_column.setChecked(rule.get("enable_serial_number", True))
         self.cb_trim_and_prefix.setChecked(rule.get("enable_trim_and_prefix", True))
         self.edit_data_prefix.setText(rule.get("data_prefix", "#"))
+        agg_idx = self.combo_duplicate_agg.findData(rule.get("duplicate_agg", "none"))
+        self.combo_duplicate_agg.setCurrentIndex(agg_idx if agg_idx >= 0 else 0)
+        type_idx = self.combo_value_type.findData(rule.get("value_column_type", "text"))
+        self.combo_value_type.setCurrentIndex(type_idx if type_idx >= 0 else 0)
+        self.edit_value_format.setText(rule.get("value_column_format", ""))
 
         self.general_output_map = rule.get("general_output_map", {})
         self.value_output_map = {self.choose_basename_for_file(f): self.choose_basename_for_file(f) for f in
@@ -701,80 +2565,7 @@ class ExcelCleanerGeneral(QMainWindow):
             self.log(f"加载规则失败: {e}", error=True)
 
     def convert_one_df(self, df: pd.DataFrame, rule: dict, metric_name: str):
-        id_col = rule["index_column"]
-        selected_cols_from_rule = rule["selected_columns"]
-
-        if id_col not in df.columns:
-            raise ValueError(f"索引列 '{id_col}' 不存在于当前文件中。")
-        df.columns = [str(c).strip() for c in df.columns]
-
-        value_cols = [c for c in selected_cols_from_rule if c in df.columns and c != id_col]
-        if not value_cols:
-            raise ValueError("没有可用的列进行展开。")
-
-        value_name = rule["value_column_alias"]
-        index_alias = rule["index_alias"] or id_col
-
-        melted = pd.melt(df, id_vars=[id_col], value_vars=value_cols,
-                         var_name=value_name, value_name=metric_name)
-
-        if rule["expand_mode"] == "index_then_value":
-            index_order_map = {v: i for i, v in enumerate(df[id_col].tolist())}
-            value_order_map = {v: i for i, v in enumerate(value_cols)}
-            melted["_idx_order"] = melted[id_col].map(index_order_map)
-            melted["_val_order"] = melted[value_name].map(value_order_map)
-            melted = melted.sort_values(by=["_idx_order", "_val_order"]).reset_index(drop=True)
-            melted.drop(columns=["_idx_order", "_val_order"], inplace=True)
-        else:
-            value_order_map = {v: i for i, v in enumerate(value_cols)}
-            index_order_map = {v: i for i, v in enumerate(df[id_col].tolist())}
-            melted["_val_order"] = melted[value_name].map(value_order_map)
-            melted["_idx_order"] = melted[id_col].map(index_order_map)
-            melted = melted.sort_values(by=["_val_order", "_idx_order"]).reset_index(drop=True)
-            melted.drop(columns=["_idx_order", "_idx_order"], inplace=True)
-
-        melted = melted.rename(columns={id_col: index_alias})
-
-        if rule.get("enable_trim_and_prefix", True):
-            data_prefix = rule.get("data_prefix", "#")
-            target_cols = [index_alias, metric_name]
-            for col in target_cols:
-                if col in melted.columns:
-                    melted[col] = melted[col].astype(str).apply(
-                        lambda x: (data_prefix * (len(x) - len(x.lstrip()))) + x.lstrip()
-                    )
-
-        # 优先使用规则中保存的 general_output_map
-        if rule.get("general_output_map"):
-            output_col_map = rule["general_output_map"].copy()
-        else:
-            output_col_map = self.general_output_map.copy()
-
-        value_col_new_name = self.value_output_map.get(os.path.splitext(metric_name)[0], metric_name)
-
-        # 新增“可配置字段”这一列的映射
-        output_col_map["可配置字段"] = value_col_new_name
-
-        output_df = pd.DataFrame()
-        final_columns = list(output_col_map.values())
-        output_df = pd.DataFrame(columns=final_columns)
-
-        for original_name, new_name in output_col_map.items():
-            if original_name == "序号":
-                if rule.get("enable_serial_number"):
-                    output_df[new_name] = range(1, len(melted) + 1)
-            elif original_name == "索引列名":
-                output_df[new_name] = melted[index_alias]
-            elif original_name == "转换后列名":
-                output_df[new_name] = melted[value_name]
-            elif original_name == "可配置字段":
-                output_df[new_name] = melted[metric_name]
-            else:
-                if original_name in melted.columns:
-                    output_df[new_name] = melted[original_name]
-                else:
-                    output_df[new_name] = pd.NA
-        return output_df
+        return convert_dataframe(df, rule, metric_name, self.general_output_map, self.value_output_map)
 
     def choose_basename_for_file(self, file_path):
         return os.path.splitext(os.path.basename(file_path))[0]
@@ -804,12 +2595,14 @@ class ExcelCleanerGeneral(QMainWindow):
             QMessageBox.warning(self, "提示", "请先点击【3】配置输出字段和顺序”按钮进行配置。")
             return
 
+        # 只读取表头和行列数做一致性检查与内存估算，不再完整解析每个文件
+        governor = MemoryGovernor(self.spin_memory_budget.value() * 1024 * 1024)
         base_columns = None
+        plans = []
         for path in self.input_files:
             try:
-                engine = 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
-                df = pd.read_excel(path, engine=engine)
-                current_columns = [str(c).strip() for c in df.columns]
+                plan = governor.plan_file(path, rule)
+                current_columns = plan["header"]
                 if base_columns is None:
                     base_columns = current_columns
                 elif set(base_columns) != set(current_columns):
@@ -817,27 +2610,231 @@ class ExcelCleanerGeneral(QMainWindow):
                                          f"检测到 **{os.path.basename(path)}** 等文件表头结构不一致，请确保批量处理的所有文件的表头字段完全相同。")
                     self.log(f"文件 {os.path.basename(path)} 表头不一致，批量处理失败。", error=True)
                     return
+                plans.append(plan)
             except Exception as e:
                 QMessageBox.critical(self, "错误", f"读取文件 **{os.path.basename(path)}** 表头失败：{e}")
                 self.log(f"读取文件 {os.path.basename(path)} 失败，批量处理终止。", error=True)
                 return
 
-        for idx, path in enumerate(list(self.input_files)):
-            try:
+        cache_dir = self.sheet_cache.cache_dir if self.sheet_cache else None
+        cache_limit = self.sheet_cache.max_bytes if self.sheet_cache else None
+        jobs = []
+        for idx, plan in enumerate(plans):
+            path = plan["path"]
+            out_name = self.output_files[idx] if idx < len(self.output_files) and self.output_files[idx] else \
+                self.edit_export_name.text().strip().format(basename=os.path.splitext(os.path.basename(path))[0])
+            out_name = self.ensure_xlsx_ext(out_name)
+            plan["out_name"] = out_name
+            out_path = os.path.join(self.export_folder, out_name)
+            args = (path, out_path, rule, self.general_output_map, self.value_output_map,
+                    plan["strategy"], plan["chunk_rows"], cache_dir, cache_limit,
+                    self.choose_basename_for_file(path))
+            jobs.append((plan, args))
+
+            peak_mb = plan["peak_bytes"] / 1024 / 1024
+            if plan["strategy"] == "chunked":
+                self.log(f"开始处理：{os.path.basename(path)}（超出内存预算，分块处理，每块 {plan['chunk_rows']} 行，预计 {peak_mb:.0f} MB）")
+            elif plan["over_budget"]:
+                self.log(f"开始处理：{os.path.basename(path)}（预计 {peak_mb:.0f} MB，超出内存预算且当前规则无法分块，将单独处理）",
+                         error=True)
+            else:
+                self.log(f"开始处理：{os.path.basename(path)}（预计 {peak_mb:.0f} MB）")
+
+        def on_done(plan, result, error):
+            if error is not None:
+                self.log(f"处理文件出错：{plan['path']} 错误：{error}", error=True)
+                return
+            if result["cache_note"]:
+                self.log(f"未缓存：{os.path.basename(plan['path'])}，原因：{result['cache_note']}", error=True)
+            self.log(f"成功导出：{plan['out_name']} （{result['rows']} 行）")
+
+        self.set_busy(True)
+        try:
+            governor.run(jobs, on_done, poll=QApplication.processEvents)
+        except Exception as e:
+            # 槽函数中未捕获的异常会使 PyQt6 直接结束程序
+            self.log(f"批量处理中断：{e}", error=True)
+        finally:
+            self.set_busy(False)
+
+    def export_all_to_sqlite(self):
+        if not self.input_files:
+            QMessageBox.warning(self, "提示", "请先导入文件")
+            return
+        if not self.config_confirmed or not self.general_output_map:
+            QMessageBox.warning(self, "警告", "请先点击【3】配置输出字段和顺序按钮进行配置确认。")
+            self.log("操作失败：请先配置输出字段和顺序。", error=True)
+            return
+        rule = self.build_rule_from_ui()
+        if not rule["index_column"] or not rule["selected_columns"]:
+            QMessageBox.warning(self, "提示", "请先选择索引列和至少一个要展开的列")
+            return
+
+        db_path, _ = QFileDialog.getSaveFileName(self, "导出到 SQLite 数据库", self.export_folder or "",
+                                                 "SQLite 数据库 (*.db *.sqlite)")
+        if not db_path:
+            return
+        table, ok = QInputDialog.getText(self, "数据表名", "请输入数据表名（已存在的同名表会被覆盖）：",
+                                         text=SQLITE_DEFAULT_TABLE)
+        if not ok or not table.strip():
+            return
+
+        output_map = rule.get("general_output_map") or self.general_output_map
+        index_column = output_map.get("索引列名", rule["index_alias"])
+        value_column = output_map.get("转换后列名", rule["value_column_alias"])
+        try:
+            writer = SqliteLongTableWriter(db_path, table.strip(), index_column, value_column)
+        except sqlite3.Error as e:
+            self.log(f"打开数据库失败：{e}", error=True)
+            return
+
+        self.set_busy(True)
+        try:
+            for path in self.input_files:
                 self.log(f"开始处理：{os.path.basename(path)}")
-                engine = 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
-                df = pd.read_excel(path, engine=engine)
+                QApplication.processEvents()
+                df = self.read_input_excel(path)
                 metric_name = self.choose_basename_for_file(path)
                 out_df = self.convert_one_df(df, rule, metric_name)
-                out_name = self.output_files[idx] if idx < len(self.output_files) and self.output_files[idx] else \
-                    self.edit_export_name.text().strip().format(basename=os.path.splitext(os.path.basename(path))[0])
-                out_name = self.ensure_xlsx_ext(out_name)
-                out_path = os.path.join(self.export_folder, out_name)
-                out_df.to_excel(out_path, index=False, engine="openpyxl")
-                self.log(f"成功导出：{out_name} （{len(out_df)} 行）")
+                metric_label = self.value_output_map.get(metric_name, metric_name)
+                writer.append(out_df, metric_label, metric_label)
+            self.log("数据写入完成，正在建立索引…")
+            QApplication.processEvents()
+            writer.finish()
+        except Exception as e:
+            writer.abort()
+            self.log(f"导出到数据库失败：{e}", error=True)
+            return
+        finally:
+            self.set_busy(False)
+        self.log(f"成功导出到数据库：{db_path} 表 {table.strip()}（{writer.rows_written} 行）")
 
-            except Exception as e:
-                self.log(f"处理文件出错：{path} 错误：{e}", error=True)
+    def submit_shared_batch(self):
+        if not self.input_files:
+            QMessageBox.warning(self, "提示", "请先导入文件")
+            return
+        if not self.export_folder:
+            QMessageBox.warning(self, "提示", "请先选择导出文件夹")
+            return
+        if not self.config_confirmed or not self.general_output_map:
+            QMessageBox.warning(self, "警告", "请先点击【3】配置输出字段和顺序按钮进行配置确认。")
+            self.log("操作失败：请先配置输出字段和顺序。", error=True)
+            return
+        rule = self.build_rule_from_ui()
+        if not rule["index_column"] or not rule["selected_columns"]:
+            QMessageBox.warning(self, "提示", "请先选择索引列和至少一个要展开的列")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "选择共享任务文件夹（各 worker 机器均可访问）")
+        if not folder:
+            return
+        try:
+            count = submit_batch(folder, self.input_files, rule, self.general_output_map, self.value_output_map,
+                                 [self.ensure_xlsx_ext(n) for n in self.output_files])
+        except OSError as e:
+            self.log(f"发布任务失败：{e}", error=True)
+            return
+        self.shared_batch_folder = folder
+        self.shared_batch_last_status = None
+        self.shared_batch_timer.start()
+        exe = os.path.basename(sys.executable) if getattr(sys, "frozen", False) else "python pro2.py"
+        self.log(f"已发布 {count} 个任务到：{folder}")
+        self.log(f"请在各处理机器上运行：{exe} --worker \"{folder}\"（可同时运行多个）")
+
+    def poll_shared_batch(self):
+        folder = self.shared_batch_folder
+        if not folder:
+            self.shared_batch_timer.stop()
+            return
+        try:
+            # 各目录不存在时按空处理，需先确认共享文件夹本身可访问，否则会误判为批次已结束
+            if not os.path.isdir(folder):
+                raise FileNotFoundError(f"无法访问 {folder}")
+            requeued = requeue_stale_jobs(folder)
+            status = batch_status(folder)
+        except OSError as e:
+            # 共享文件夹暂时不可访问（如网络中断）时下次轮询再试，同样的错误只记录一次
+            if self.shared_batch_last_status != str(e):
+                self.shared_batch_last_status = str(e)
+                self.log(f"读取共享文件夹失败：{e}，稍后重试。", error=True)
+            return
+        if requeued:
+            self.log(f"{requeued} 个任务心跳超时，已重新放回待处理队列。", error=True)
+        if status != self.shared_batch_last_status:
+            self.shared_batch_last_status = status
+            self.log(f"分布式任务进度：待处理 {status['pending']}，处理中 {status['claimed']}，"
+                     f"完成 {status['done']}，失败 {status['failed']}")
+        if status["pending"] or status["claimed"]:
+            return
+
+        import shutil
+        self.shared_batch_timer.stop()
+        self.shared_batch_folder = None
+        dirs = job_dirs(folder)
+        if not self.export_folder:
+            self.log(f"分布式任务全部结束，但未选择导出文件夹，结果保留在：{dirs['outputs']}", error=True)
+            return
+        try:
+            failed = batch_job_names(folder, "failed")
+            done = batch_job_names(folder, "done")
+        except OSError as e:
+            self.log(f"读取分布式任务结果失败：{e}", error=True)
+            return
+        for name in failed:
+            try:
+                with open(os.path.join(dirs["failed"], name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                self.log(f"读取失败记录 {name} 出错：{e}", error=True)
+                continue
+            self.log(f"处理文件出错：{job['input']} 错误：{job.get('error')}（worker：{job.get('worker')}）", error=True)
+        copied = 0
+        for name in done:
+            try:
+                with open(os.path.join(dirs["done"], name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                self.log(f"读取完成记录 {name} 出错：{e}", error=True)
+                continue
+            try:
+                shutil.copy2(os.path.join(dirs["outputs"], job.get("batch_id") or "", job["output"]),
+                             os.path.join(self.export_folder, job["output"]))
+                copied += 1
+            except OSError as e:
+                self.log(f"复制结果失败：{job['output']} 错误：{e}", error=True)
+        self.log(f"分布式任务全部结束，已将 {copied} 个结果复制到导出文件夹。")
+
+    def toggle_watch_folder(self):
+        if self.watch_service is not None:
+            self.watch_service.stop()
+            self.watch_service.deleteLater()
+            self.watch_service = None
+            self.btn_watch_folder.setText("开始监控文件夹（自动转换）")
+            return
+
+        if not self.export_folder:
+            QMessageBox.warning(self, "提示", "请先选择导出文件夹")
+            return
+        if not self.config_confirmed or not self.general_output_map:
+            QMessageBox.warning(self, "警告", "请先点击【3】配置输出字段和顺序按钮进行配置确认。")
+            return
+        rule = self.build_rule_from_ui()
+        if not rule["index_column"] or not rule["selected_columns"]:
+            QMessageBox.warning(self, "提示", "请先选择索引列和至少一个要展开的列")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "选择要监控的输入文件夹", self.input_folder or "")
+        if not folder:
+            return
+        if os.path.normcase(os.path.abspath(folder)) == os.path.normcase(os.path.abspath(self.export_folder)):
+            QMessageBox.warning(self, "提示", "监控文件夹不能与导出文件夹相同，否则导出结果会被重复转换。")
+            return
+
+        self.watch_service = FolderWatchService(folder, self.export_folder, rule, self.general_output_map,
+                                                self.value_output_map, self.sheet_cache, parent=self)
+        self.watch_service.log_message.connect(self.log)
+        self.watch_service.start()
+        self.btn_watch_folder.setText("停止监控文件夹")
 
     def export_current_single(self):
         if not self.input_files:
@@ -860,22 +2857,90 @@ class ExcelCleanerGeneral(QMainWindow):
             return
 
         try:
-            engine = 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
-            df = pd.read_excel(path, engine=engine)
+            df = self.read_input_excel(path)
             metric_name = self.choose_basename_for_file(path)
             out_df = self.convert_one_df(df, rule, metric_name)
             tpl = self.edit_export_name.text().strip() or self.rule.get("output_name_template", "清洗_{basename}.xlsx")
             out_name = tpl.format(basename=os.path.splitext(os.path.basename(path))[0])
             out_name = self.ensure_xlsx_ext(out_name)
             out_path = os.path.join(self.export_folder, out_name)
-            out_df.to_excel(out_path, index=False, engine="openpyxl")
+            write_output_excel(out_df, out_path, rule)
             self.log(f"成功导出（单文件）：{out_name}")
         except Exception as e:
             self.log(f"导出出错：{e}", error=True)
 
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+class FirstPaintNotifier(QObject):
+    """窗口第一次绘制完成后发出 first_painted 信号。"""
+
+    first_painted = pyqtSignal()
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            # 延后到本次绘制处理完之后再通知
+            QTimer.singleShot(0, self.first_painted.emit)
+        return False
+
+
+def start_gui(argv):
+    """创建并显示主窗口，返回 (app, window, notifier)；启动耗时基准也走这条路径。"""
+    app = QApplication(argv)
     window = ExcelCleanerGeneral()
+    notifier = FirstPaintNotifier(window)
+    # 首帧绘制完成后再在后台预热 pandas，不与窗口出现争抢时间
+    notifier.first_painted.connect(lambda: QTimer.singleShot(0, preload_heavy_modules))
     window.show()
+    return app, window, notifier
+
+
+def parse_cli_args(argv):
+    parser = argparse.ArgumentParser(description="宽表转长表通用工具")
+    parser.add_argument("--worker", metavar="共享文件夹", help="以无界面 worker 方式运行，处理共享文件夹中的任务")
+    parser.add_argument("--worker-id", help="worker 标识，默认 主机名-进程号")
+    parser.add_argument("--exit-when-idle", action="store_true", help="没有待处理任务时退出")
+    parser.add_argument("--submit", metavar="共享文件夹", help="无界面发布任务：需配合 --rule 与输入文件")
+    parser.add_argument("--status", metavar="共享文件夹", help="查看共享文件夹中的任务进度")
+    parser.add_argument("--rule", help="规则 JSON 文件（“保存规则”导出的格式）")
+    parser.add_argument("--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET_MB, help="内存预算（MB）")
+    parser.add_argument("--serve", action="store_true", help="以本地 HTTP 转换服务方式运行（仅监听 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=SERVICE_DEFAULT_PORT, help="转换服务端口")
+    parser.add_argument("--workers", type=int, help="转换服务的工作进程数，默认 CPU 数 - 1")
+    parser.add_argument("files", nargs="*", help="输入的 Excel 文件")
+    # 窗口模式下可能带有系统传入的额外参数，忽略无法识别的参数
+    return parser.parse_known_args(argv)[0]
+
+
+def run_cli(args) -> int:
+    if args.serve:
+        run_service(args.port, args.workers)
+        return 0
+    if args.worker:
+        run_worker(args.worker, args.worker_id, args.exit_when_idle, args.memory_budget * 1024 * 1024)
+        return 0
+    if args.submit:
+        if not args.rule or not args.files:
+            print("--submit 需要 --rule 和至少一个输入文件", file=sys.stderr)
+            return 2
+        with open(args.rule, "r", encoding="utf-8") as f:
+            rule = json.load(f)
+        count = submit_batch(args.submit, args.files, rule, rule.get("general_output_map"))
+        print(f"已发布 {count} 个任务到 {args.submit}")
+        return 0
+    print(json.dumps(batch_status(args.status), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    # 打包为 exe 后，批量转换的子进程需要 freeze_support 才能正常启动
+    import multiprocessing
+    multiprocessing.freeze_support()
+    cli_args = parse_cli_args(sys.argv[1:])
+    if cli_args.serve or cli_args.worker or cli_args.submit or cli_args.status:
+        sys.exit(run_cli(cli_args))
+    app, window, notifier = start_gui(sys.argv)
     sys.exit(app.exec())
\ No newline at end of file